@@ -1,13 +1,36 @@
 import sqlite3
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-import pickle
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash
+import hmac
+import json
 import os
+import time
+import uuid
 import openai
-from openai import OpenAI
+from datetime import datetime, timezone
 from functools import wraps
 import stripe
 from flask_dance.contrib.google import make_google_blueprint, google
-from database_utils import add_appointment, init_db, get_doctors, get_all_specialties, get_all_locations, get_doctor_by_id, get_patients, get_dashboard_stats, get_risk_distribution, get_registration_trends, add_patient, add_user, get_user, get_user_by_google_id, update_user
+from database_utils import add_appointment, add_vitals_batch, get_existing_patient_ids, init_db, get_doctors, get_all_specialties, get_all_locations, get_doctor_by_id, get_patients, get_dashboard_stats, get_risk_distribution, get_registration_trends, get_open_alerts, add_patient, add_user, get_user, get_user_by_google_id, update_user
+from model_utils import get_current_models, get_model_version, normalize_features, predict_risk, risk_label
+from prediction_cache import PredictionCache
+from inference_scheduler import InferenceScheduler
+from shadow_scoring import load_shadow_scorer
+from risk_grid import load_risk_grid_manager
+from model_server import MODEL_SERVER_SOCKET, ModelClient
+from contributions import get_contribution_engine
+from drift_monitor import DriftMonitor
+from reevaluation import RiskReevaluator
+from trend_engine import TrendEngine
+from bulkhead import Bulkhead, BulkheadFull
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from chat_service import (CHAT_BREAKER_FAILURE_RATE, CHAT_BREAKER_MIN_CALLS, CHAT_BREAKER_RESET_TIMEOUT,
+                          CHAT_BREAKER_WINDOW, CHAT_MAX_CONCURRENCY, CHAT_QUEUE_TIMEOUT, ChatService,
+                          make_openai_client)
+from chat_cache import ChatResponseCache
+from chat_memory import ChatMemory
+from coalescing import SingleFlight
+from faq_retrieval import load_faq_index
+from ingestion import VitalsWriter, WriterSaturated, iter_line_chunks, parse_vitals_lines
 
 app = Flask(__name__, template_folder='frontend/templates', static_folder='frontend/static')
 app.secret_key = 'your-secret-key-here-change-in-production'  # Change this to a secure random key in production
@@ -41,21 +64,146 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Load models
-model_path = 'models/maternal_risk_model.pkl'
-scaler_path = 'models/scaler.pkl'
+# Repeated vitals skip scaler.transform and model.predict entirely
+prediction_cache = PredictionCache()
 
-if os.path.exists(model_path):
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
-    with open(scaler_path, 'rb') as f:
-        scaler = pickle.load(f)
-else:
-    model = None
-    scaler = None
+def predict_risk_batch(rows):
+    model, scaler, _ = get_current_models()
+    if model is None or scaler is None:
+        return None
+    return [int(prediction) for prediction in predict_risk(model, scaler, rows)]
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# With MODEL_SERVER_SOCKET set, a separate model_server.py process owns the model and
+# this worker only loads it in-process as a fallback when the server is unreachable
+model_client = ModelClient(MODEL_SERVER_SOCKET, fallback=predict_risk_batch) if MODEL_SERVER_SOCKET else None
+
+if not model_client:
+    # Load models up front (reloaded automatically when the artifacts change on disk)
+    get_current_models()
+
+# Optional micro-batching of concurrent /maternal predictions under threaded serving
+inference_scheduler = InferenceScheduler(predict_risk_batch) if os.getenv('INFERENCE_BATCHING') == '1' else None
+
+# Candidate model scored on live traffic in the background when SHADOW_MODEL_DIR is set
+shadow_scorer = load_shadow_scorer()
+
+# Optional O(1) lookups from a precomputed prediction grid when RISK_GRID=1
+risk_grid_manager = load_risk_grid_manager()
+
+# Served vitals compared against the training distribution
+drift_monitor = DriftMonitor()
+
+# Patients with new vitals get their stored risk_level re-scored in the background
+risk_reevaluator = RiskReevaluator()
+
+# Rolling BP/sugar trends per patient, warmed once from the latest stored readings
+trend_engine = TrendEngine()
+trend_engine.bootstrap()
+
+def store_vitals(readings):
+    """Commit (patient_id, measured_at, age, bmi, bp, hb, sugar) readings; returns them as stored."""
+    # Stamp readings without a time here, so the trend engine orders them as the database does
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    readings = [(reading[0], reading[1] or now, *reading[2:7]) for reading in readings]
+    add_vitals_batch(readings)
+    return readings
+
+def update_risk_and_trends(readings):
+    """Re-score risk and update trends for committed readings; failures never undo the write."""
+    patient_ids = [reading[0] for reading in readings]
+    try:
+        risk_reevaluator.enqueue(patient_ids)
+    except Exception as e:
+        print(f"Error queueing risk re-evaluation: {e}")
+    try:
+        trend_engine.evaluate(trend_engine.add_readings(patient_ids, [reading[1] for reading in readings],
+                                                        [reading[2:7] for reading in readings]))
+    except Exception as e:
+        print(f"Error updating vitals trends: {e}")
+
+def record_vitals(readings):
+    """Store readings, then update risk and trends."""
+    update_risk_and_trends(store_vitals(readings))
+
+# Device uploads are written by one background writer; a full queue means 429 + Retry-After.
+# Chunks are acked once committed, before risk and trends are updated.
+vitals_writer = VitalsWriter(store_vitals, update_risk_and_trends)
+INGEST_API_KEY = os.getenv('INGEST_API_KEY')
+INGEST_ACK_TIMEOUT = float(os.getenv('INGEST_ACK_TIMEOUT', '30'))
+
+def predict_maternal_risk(features, model, scaler, model_version):
+    """Predict one normalized feature row through the grid, cache and model, in that order.
+
+    Returns (prediction, source), source being 'grid', 'cache' or 'model'.
+    """
+    start = time.perf_counter()
+    grid = risk_grid_manager.get(model, scaler, model_version) if risk_grid_manager else None
+    # Out-of-range inputs, cells on a decision boundary, or no grid yet fall back to the full model
+    prediction = grid.lookup(features) if grid else None
+    source = 'grid'
+    if prediction is None:
+        prediction = prediction_cache.get(model_version, features)
+        source = 'cache'
+    if prediction is None:
+        if inference_scheduler:
+            prediction = inference_scheduler.predict(features)
+        else:
+            prediction = int(predict_risk(model, scaler, [features])[0])
+        prediction_cache.put(model_version, features, prediction)
+        source = 'model'
+    if shadow_scorer:
+        shadow_scorer.observe_production(source, time.perf_counter() - start)
+        shadow_scorer.submit(features, prediction)
+    return prediction, source
+
+# Initialize OpenAI client: one pooled HTTP client with timeouts, shared by all requests
+openai_client = make_openai_client()
+# At most CHAT_MAX_CONCURRENCY threads wait on OpenAI at once, so a slow upstream can't take every worker
+chat_bulkhead = Bulkhead(CHAT_MAX_CONCURRENCY, CHAT_QUEUE_TIMEOUT)
+# While OpenAI is failing, /chat answers locally right away instead of waiting on each failure
+chat_breaker = CircuitBreaker(CHAT_BREAKER_FAILURE_RATE, CHAT_BREAKER_MIN_CALLS, CHAT_BREAKER_WINDOW,
+                              CHAT_BREAKER_RESET_TIMEOUT)
+# Repeated and reworded questions (same content words) are answered from a SQLite cache shared by
+# all workers (CHAT_CACHE=0 disables it)
+chat_cache = ChatResponseCache() if os.getenv('CHAT_CACHE', '1') == '1' else None
+# Common questions are answered from the curated FAQ without an API call (FAQ_RETRIEVAL=0 disables it)
+faq_index = load_faq_index() if os.getenv('FAQ_RETRIEVAL', '1') == '1' else None
+# Per-session conversation history kept server-side within a token budget (CHAT_MEMORY=0 disables it)
+chat_memory = ChatMemory() if os.getenv('CHAT_MEMORY', '1') == '1' else None
+# Identical questions asked at the same moment share one OpenAI call (CHAT_COALESCING=0 disables it)
+chat_coalescer = SingleFlight() if os.getenv('CHAT_COALESCING', '1') == '1' else None
+chat_service = ChatService(openai_client, cache=chat_cache, faq=faq_index, bulkhead=chat_bulkhead,
+                           breaker=chat_breaker, memory=chat_memory, coalescer=chat_coalescer)
+# Set by async_server when it serves /chat on an event loop
+async_chat_server = None
+
+def chat_session_id():
+    if 'chat_session_id' not in session:
+        session['chat_session_id'] = uuid.uuid4().hex
+    return session['chat_session_id']
+
+def sse_event(data, event=None):
+    prefix = f'event: {event}\n' if event else ''
+    return f'{prefix}data: {json.dumps(data)}\n\n'
+
+def chat_event_stream(first_token, tokens=None, degraded=False):
+    """Relay answer tokens as server-sent events; closing it cancels the upstream request."""
+    try:
+        if first_token is not None:
+            yield sse_event({'token': first_token})
+        for token in tokens or ():
+            yield sse_event({'token': token})
+        yield sse_event({'degraded': True} if degraded else {}, 'done')
+    except Exception as e:
+        print(f"Error in chat stream: {e}")
+        yield sse_event({'error': 'Internal server error'}, 'error')
+    finally:
+        if tokens is not None:
+            tokens.close()
+
+def chat_stream_response(first_token, tokens=None, degraded=False):
+    return Response(chat_event_stream(first_token, tokens, degraded), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/')
 def index():
@@ -150,11 +298,12 @@ def profile():
 
     return render_template('profile.html', user_data=user_data)
 
-@login_required
 @app.route('/maternal', methods=['GET', 'POST'])
+@login_required
 def maternal():
     result = None
     error = None
+    explanation = None
     if request.method == 'POST':
         try:
             age_str = request.form.get('age', '').strip()
@@ -162,9 +311,13 @@ def maternal():
             bp_str = request.form.get('bp', '').strip()
             hb_str = request.form.get('hb', '').strip()
             sugar_str = request.form.get('sugar', '').strip()
+            patient_id_str = request.form.get('patient_id', '').strip()
 
             if not all([age_str, bmi_str, bp_str, hb_str, sugar_str]):
                 error = "All fields are required."
+            elif patient_id_str and int(patient_id_str) not in get_existing_patient_ids([int(patient_id_str)]):
+                # Readings are only stored for real patients; SQLite doesn't enforce the foreign key
+                error = "Unknown patient ID."
             else:
                 age = float(age_str)
                 bmi = float(bmi_str)
@@ -176,17 +329,36 @@ def maternal():
                 hb = float(hb_str)
                 sugar = float(sugar_str)
 
+                # Keep the reading when it belongs to a patient (checked above)
+                if patient_id_str:
+                    record_vitals([(int(patient_id_str), None, age, bmi, bp, hb, sugar)])
+
+                features = normalize_features([age, bmi, bp, hb, sugar])
+                drift_monitor.observe(features)
+                if model_client:
+                    prediction = model_client.predict_one(features)
+                else:
+                    model, scaler, model_version = get_current_models()
+                    prediction, source = (predict_maternal_risk(features, model, scaler, model_version)
+                                          if model and scaler else (None, None))
+                    if prediction is not None:
+                        # Why the model said what it did: per-feature contributions to the risk probability.
+                        # They describe the forest itself, so where a grid or cache answer differs from the
+                        # forest's for these inputs, the forest's answer is served with its explanation.
+                        explanation = get_contribution_engine(model, scaler, model_version).explain_one(features)
+                        if explanation['prediction'] != prediction:
+                            prediction, source = explanation['prediction'], 'model'
+                        explanation['source'] = source
+
                 # Dummy prediction if model not loaded
-                if model and scaler:
-                    features = scaler.transform([[age, bmi, bp, hb, sugar]])
-                    prediction = model.predict(features)[0]
-                    result = 'High Risk' if prediction == 1 else 'Low Risk'
+                if prediction is not None:
+                    result = risk_label(prediction)
                 else:
                     result = 'Low Risk' if age < 30 else 'High Risk'
         except ValueError as e:
             error = "Invalid input. Please enter numeric values."
 
-    return render_template('maternal_risk.html', result=result, error=error)
+    return render_template('maternal_risk.html', result=result, error=error, explanation=explanation)
 
 @login_required
 @app.route('/child', methods=['GET', 'POST'])
@@ -274,42 +446,40 @@ def chat():
         if not user_message:
             return jsonify({'error': 'No message provided'}), 400
 
-        # System prompt for health-focused AI
-        system_prompt = """You are a helpful AI health assistant specializing in maternal and child care. You provide accurate, evidence-based information about:
-
-- Pregnancy and prenatal care
-- Child development and growth
-- Nutrition for mothers and children
-- Common health concerns and preventive care
-- General wellness advice
-
-Important guidelines:
-- Always emphasize consulting healthcare professionals for medical advice
-- Provide general information, not personalized medical diagnoses
-- Be supportive and encouraging
-- Use clear, simple language
-- If asked about serious medical conditions, recommend seeing a doctor
+        stream = bool(data.get('stream'))
+        if stream:
+            # Start the stream here so a full bulkhead or failed upstream call is handled below
+            tokens = chat_service.stream(user_message, chat_session_id())
+            first_token = next(tokens, None)
+            return chat_stream_response(first_token, tokens)
 
-Remember: You are not a substitute for professional medical care."""
-
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-
-        ai_response = response.choices[0].message.content.strip()
+        ai_response = chat_service.complete(user_message, chat_session_id())
 
         return jsonify({'response': ai_response})
 
+    except BulkheadFull:
+        return jsonify({'error': 'Chat is busy, please try again shortly'}), 503, {'Retry-After': '1'}
+    except (CircuitOpen, openai.APIError) as e:
+        if not isinstance(e, CircuitOpen):
+            print(f"Error in chat endpoint: {e}")
+        # Degrade to a local answer rather than failing the request
+        answer = chat_service.fallback_answer(user_message)
+        if stream:
+            return chat_stream_response(answer, degraded=True)
+        return jsonify({'response': answer, 'degraded': True})
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@login_required
+@app.route('/chat/reset', methods=['POST'])
+def chat_reset():
+    # Start a new conversation; the old history is dropped server-side
+    session_id = session.pop('chat_session_id', None)
+    if chat_memory and session_id:
+        chat_memory.clear(session_id)
+    return jsonify({'message': 'Conversation cleared'})
+
 @login_required
 @app.route('/appointments', methods=['GET', 'POST'])
 def appointments_route():
@@ -486,5 +656,72 @@ def registration_trends():
     trends = get_registration_trends()
     return jsonify(trends)
 
+@login_required
+@app.route('/api/dashboard/alerts')
+def dashboard_alerts():
+    alerts = get_open_alerts(limit=20)
+    return jsonify(alerts)
+
+@app.route('/api/vitals/ingest', methods=['POST'])
+def ingest_vitals():
+    """Bulk NDJSON vitals upload for connected devices.
+
+    One JSON object per line with patient_id, optional measured_at and the five
+    vitals. Lines are validated and queued in chunks; the response acks each
+    chunk once it is committed. When the writer is saturated the remaining
+    lines are refused with 429, and resume_from_line tells the device where to
+    continue after Retry-After seconds.
+    """
+    # Fail closed: without a configured key nobody may write vitals
+    if not INGEST_API_KEY:
+        return jsonify({'error': 'Vitals ingestion is not configured'}), 503
+    if not hmac.compare_digest(request.headers.get('X-Api-Key', '').encode(), INGEST_API_KEY.encode()):
+        return jsonify({'error': 'Invalid API key'}), 401
+    pending = []
+    resume_from_line = None
+    for batch, numbered_lines in enumerate(iter_line_chunks(request.stream)):
+        first_line = numbered_lines[0][0]
+        readings, errors = parse_vitals_lines(numbered_lines, get_existing_patient_ids)
+        try:
+            future = vitals_writer.submit(readings) if readings else None
+        except WriterSaturated:
+            resume_from_line = first_line
+            break
+        pending.append((batch, first_line, len(readings), errors, future))
+
+    acks = []
+    for batch, first_line, accepted, errors, future in pending:
+        try:
+            written = future.result(timeout=INGEST_ACK_TIMEOUT) if future else 0
+            ack = {'batch': batch, 'first_line': first_line, 'accepted': written, 'rejected': errors}
+        except Exception as e:
+            print(f"Error ingesting vitals batch {batch}: {e}")
+            ack = {'batch': batch, 'first_line': first_line, 'accepted': 0, 'rejected': errors,
+                   'error': 'Write failed'}
+        acks.append(ack)
+
+    if resume_from_line is not None:
+        response = jsonify({'acks': acks, 'resume_from_line': resume_from_line})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(vitals_writer.retry_after())
+        return response
+    return jsonify({'acks': acks})
+
+@app.route('/api/metrics')
+def metrics():
+    return jsonify({
+        'prediction_cache': prediction_cache.stats(),
+        'inference_scheduler': inference_scheduler.stats() if inference_scheduler else None,
+        'shadow_scoring': shadow_scorer.stats() if shadow_scorer else None,
+        'risk_grid': risk_grid_manager.stats() if risk_grid_manager else None,
+        'model_server': model_client.stats() if model_client else None,
+        'drift': drift_monitor.stats(get_model_version()),
+        'risk_reevaluation': risk_reevaluator.stats(),
+        'trends': trend_engine.stats(),
+        'vitals_ingestion': vitals_writer.stats(),
+        'chat': chat_service.stats(),
+        'chat_async': async_chat_server.stats() if async_chat_server else None,
+    })
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,314 @@
+"""Async deployment mode: /chat on an asyncio event loop, every other route on the Flask app.
+
+POST /chat is answered by an AsyncChatService over the AsyncOpenAI client, so a
+request waiting on OpenAI is a suspended coroutine instead of a blocked worker
+thread and one process can hold thousands of chat requests open. All other
+requests are passed to the unchanged Flask app on a small thread pool, the
+same way a threaded WSGI server would run them. The chat session id lives in
+the Flask session cookie, so both halves see the same conversation.
+
+HTTP/1.1 parsing uses h11 (in requirements.txt). Request bodies are read fully
+before the Flask app sees them. This mode needs Python 3.11 or newer.
+
+Run:
+    python async_server.py --port 5000 --wsgi-threads 8
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing, nullcontext
+from urllib.parse import unquote_to_bytes
+import h11
+import openai
+from werkzeug.http import dump_cookie, parse_cookie
+
+import app as web
+from bulkhead import AsyncBulkhead, BulkheadFull
+from chat_service import (CHAT_ASYNC_MAX_CONCURRENCY, CHAT_QUEUE_TIMEOUT, AsyncChatService,
+                          make_async_openai_clients)
+from circuit_breaker import CircuitOpen
+from coalescing import AsyncSingleFlight
+
+ASYNC_WSGI_THREADS = int(os.getenv('ASYNC_WSGI_THREADS', '8'))
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 75.0
+MAX_REQUEST_BODY = 16 * 1024 * 1024
+LISTEN_BACKLOG = 2048
+READ_SIZE = 65536
+
+def make_async_chat_service():
+    """AsyncChatService sharing the Flask app's caches, FAQ, memory and circuit breaker.
+
+    Coalescing follows the app's CHAT_COALESCING setting, with an event-loop SingleFlight.
+    """
+    return AsyncChatService(
+        make_async_openai_clients(), cache=web.chat_cache, faq=web.faq_index,
+        bulkhead=AsyncBulkhead(CHAT_ASYNC_MAX_CONCURRENCY, CHAT_QUEUE_TIMEOUT), breaker=web.chat_breaker,
+        memory=web.chat_memory, coalescer=AsyncSingleFlight() if web.chat_coalescer is not None else None)
+
+def wsgi_environ(request, body, server_address, client_address):
+    path, _, query = request.target.decode('latin-1').partition('?')
+    environ = {
+        'REQUEST_METHOD': request.method.decode('ascii'),
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_NAME': server_address[0],
+        'SERVER_PORT': str(server_address[1]),
+        'SERVER_PROTOCOL': f'HTTP/{request.http_version.decode()}',
+        'REMOTE_ADDR': client_address[0] if client_address else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-length':
+            continue
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+            continue
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+def call_wsgi(app, environ):
+    """Run the WSGI app up to its first body chunk; return (status, headers, body iterable)."""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    body = app(environ, start_response)
+    return started[0], started[1], body
+
+class ChatSessions:
+    """Reads and sets chat_session_id in the Flask session cookie outside a Flask request."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interface = app.session_interface
+        self.serializer = self.interface.get_signing_serializer(app)
+        self.cookie_name = app.config['SESSION_COOKIE_NAME']
+
+    def session_id(self, request):
+        """Return (chat session id, Set-Cookie header value or None)."""
+        if self.serializer is None:
+            return None, None
+        data = {}
+        for name, value in request.headers:
+            if name == b'cookie':
+                cookie = parse_cookie(value.decode('latin-1')).get(self.cookie_name)
+                if cookie:
+                    try:
+                        data = self.serializer.loads(
+                            cookie, max_age=int(self.app.permanent_session_lifetime.total_seconds()))
+                    except Exception:
+                        data = {}
+        if data.get('chat_session_id'):
+            return data['chat_session_id'], None
+        data['chat_session_id'] = uuid.uuid4().hex
+        app = self.app
+        set_cookie = dump_cookie(
+            self.cookie_name, self.serializer.dumps(data), domain=self.interface.get_cookie_domain(app),
+            path=self.interface.get_cookie_path(app), secure=self.interface.get_cookie_secure(app),
+            httponly=self.interface.get_cookie_httponly(app), samesite=self.interface.get_cookie_samesite(app))
+        return data['chat_session_id'], set_cookie
+
+class AsyncChatServer:
+    """HTTP/1.1 server on one event loop: POST /chat natively, everything else through the WSGI app."""
+
+    def __init__(self, app, chat_service, wsgi_threads=ASYNC_WSGI_THREADS):
+        self.app = app
+        self.chat_service = chat_service
+        self.sessions = ChatSessions(app)
+        self.wsgi_pool = ThreadPoolExecutor(wsgi_threads, thread_name_prefix='wsgi')
+        self.open_connections = 0
+        self.peak_connections = 0
+
+    async def _send(self, conn, writer, event):
+        data = conn.send(event)
+        if data:
+            writer.write(data)
+            await writer.drain()
+
+    async def _read_request(self, conn, reader):
+        """Return (h11.Request, body bytes), or (None, None) once the client is done."""
+        request = None
+        body = bytearray()
+        while True:
+            event = conn.next_event()
+            if event is h11.NEED_DATA:
+                data = await asyncio.wait_for(reader.read(READ_SIZE), KEEPALIVE_TIMEOUT)
+                conn.receive_data(data)
+            elif isinstance(event, h11.Request):
+                request = event
+                # Refuse a declared oversized body before reading any of it
+                length = dict(event.headers).get(b'content-length')
+                if length is not None and int(length) > MAX_REQUEST_BODY:
+                    raise h11.RemoteProtocolError('request body too large', error_status_hint=413)
+            elif isinstance(event, h11.Data):
+                body += event.data
+                if len(body) > MAX_REQUEST_BODY:
+                    raise h11.RemoteProtocolError('request body too large', error_status_hint=413)
+            elif isinstance(event, h11.EndOfMessage):
+                return request, bytes(body)
+            elif isinstance(event, (h11.ConnectionClosed, h11.PAUSED)):
+                return None, None
+
+    async def handle_connection(self, reader, writer):
+        conn = h11.Connection(h11.SERVER)
+        self.open_connections += 1
+        self.peak_connections = max(self.peak_connections, self.open_connections)
+        try:
+            while True:
+                try:
+                    request, body = await self._read_request(conn, reader)
+                except h11.RemoteProtocolError as e:
+                    if conn.our_state in (h11.IDLE, h11.SEND_RESPONSE):
+                        await self._send_json(conn, writer, e.error_status_hint, {'error': str(e)})
+                    break
+                if request is None:
+                    break
+                if request.method == b'POST' and request.target.split(b'?')[0] == b'/chat':
+                    await self.chat(conn, writer, request, body)
+                else:
+                    await self.wsgi(conn, writer, request, body, writer.get_extra_info('peername'))
+                if conn.our_state is not h11.DONE or conn.their_state is not h11.DONE:
+                    break
+                conn.start_next_cycle()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f"Error in async server connection: {e}")
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def wsgi(self, conn, writer, request, body, peername):
+        loop = asyncio.get_running_loop()
+        environ = wsgi_environ(request, body, writer.get_extra_info('sockname'), peername)
+        status, headers, chunks = await loop.run_in_executor(self.wsgi_pool, call_wsgi, self.app, environ)
+        try:
+            code = int(status.split(' ', 1)[0])
+            await self._send(conn, writer, h11.Response(status_code=code, headers=headers))
+            iterator = iter(chunks)
+            while True:
+                chunk = await loop.run_in_executor(self.wsgi_pool, next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await self._send(conn, writer, h11.Data(data=chunk))
+            await self._send(conn, writer, h11.EndOfMessage())
+        finally:
+            if hasattr(chunks, 'close'):
+                await loop.run_in_executor(self.wsgi_pool, chunks.close)
+
+    async def _send_json(self, conn, writer, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(body))), *headers]
+        await self._send(conn, writer, h11.Response(status_code=status, headers=headers))
+        await self._send(conn, writer, h11.Data(data=body))
+        await self._send(conn, writer, h11.EndOfMessage())
+
+    async def chat(self, conn, writer, request, body):
+        """Same contract as the Flask /chat route."""
+        stream = False
+        user_message = ''
+        try:
+            data = json.loads(body or b'null')
+            user_message = (data or {}).get('message', '')
+            if not user_message:
+                await self._send_json(conn, writer, 400, {'error': 'No message provided'})
+                return
+            stream = bool(data.get('stream'))
+            session_id, set_cookie = self.sessions.session_id(request)
+            cookie_headers = [('Set-Cookie', set_cookie)] if set_cookie else []
+            if stream:
+                tokens = self.chat_service.stream(user_message, session_id)
+                try:
+                    # Start the stream here so a full bulkhead or failed upstream call is handled below
+                    first_token = await anext(tokens, None)
+                except BaseException:
+                    await tokens.aclose()
+                    raise
+                await self._send_stream(conn, writer, first_token, tokens, headers=cookie_headers)
+                return
+            answer = await self.chat_service.complete(user_message, session_id)
+            await self._send_json(conn, writer, 200, {'response': answer}, cookie_headers)
+        except BulkheadFull:
+            await self._send_json(conn, writer, 503, {'error': 'Chat is busy, please try again shortly'},
+                                  [('Retry-After', '1')])
+        except (CircuitOpen, openai.APIError) as e:
+            if not isinstance(e, CircuitOpen):
+                print(f"Error in chat endpoint: {e}")
+            # Degrade to a local answer rather than failing the request
+            answer = self.chat_service.fallback_answer(user_message)
+            if stream:
+                await self._send_stream(conn, writer, answer, degraded=True)
+            else:
+                await self._send_json(conn, writer, 200, {'response': answer, 'degraded': True})
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            print(f"Error in chat endpoint: {e}")
+            if conn.our_state is h11.SEND_RESPONSE:
+                await self._send_json(conn, writer, 500, {'error': 'Internal server error'})
+
+    async def _send_stream(self, conn, writer, first_token, tokens=None, degraded=False, headers=()):
+        """Relay answer tokens as server-sent events, like chat_event_stream in app.py."""
+        headers = [('Content-Type', 'text/event-stream'), ('Cache-Control', 'no-cache'),
+                   ('X-Accel-Buffering', 'no'), *headers]
+        try:
+            async with aclosing(tokens) if tokens is not None else nullcontext():
+                await self._send(conn, writer, h11.Response(status_code=200, headers=headers))
+                if first_token is not None:
+                    await self._send(conn, writer, h11.Data(data=web.sse_event({'token': first_token}).encode()))
+                if tokens is not None:
+                    async for token in tokens:
+                        await self._send(conn, writer, h11.Data(data=web.sse_event({'token': token}).encode()))
+            done = web.sse_event({'degraded': True} if degraded else {}, 'done')
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            done = web.sse_event({'error': 'Internal server error'}, 'error')
+        await self._send(conn, writer, h11.Data(data=done.encode()))
+        await self._send(conn, writer, h11.EndOfMessage())
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=LISTEN_BACKLOG)
+        async with server:
+            await server.serve_forever()
+
+    def stats(self):
+        return {
+            'open_connections': self.open_connections,
+            'peak_connections': self.peak_connections,
+            'chat': self.chat_service.stats(),
+        }
+
+def create_server(wsgi_threads=ASYNC_WSGI_THREADS):
+    server = AsyncChatServer(web.app, make_async_chat_service(), wsgi_threads)
+    # Lets /api/metrics report the async chat path
+    web.async_chat_server = server
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve /chat on an event loop and the rest of the app on threads.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--wsgi-threads', type=int, default=ASYNC_WSGI_THREADS)
+    args = parser.parse_args()
+    print(f'Serving on http://{args.host}:{args.port} (async /chat, {args.wsgi_threads} WSGI threads)')
+    asyncio.run(create_server(args.wsgi_threads).serve(args.host, args.port))
@@ -0,0 +1,164 @@
+"""Benchmark: concurrent /chat capacity of the threaded WSGI deployment vs async_server.
+
+Opens N simultaneous /chat requests against each mode, with a mock OpenAI API
+(in a subprocess) that takes --latency-ms per answer, while probing a dashboard route. The
+threaded mode serves everything from --workers threads (like gunicorn --threads);
+the async mode serves /chat on an event loop and the other routes from
+--wsgi-threads threads. Run from the repository root:
+    python -m benchmarks.chat_async_capacity --connections 100 500 1000 --workers 32
+"""
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import httpx
+import numpy as np
+
+CLIENT_SHARD_CONNECTIONS = 64
+
+async def flood(base, connections, timeout):
+    """Send `connections` /chat requests at once; return (latencies of answers, other outcomes, probe latencies).
+
+    Degraded (local fallback) answers count as answered but are also listed among the outcomes.
+    """
+    # Small pools side by side, for the same reason as make_async_openai_clients
+    limits = httpx.Limits(max_connections=CLIENT_SHARD_CONNECTIONS)
+    shards = [httpx.AsyncClient(base_url=base, limits=limits, timeout=timeout)
+              for _ in range(-(-connections // CLIENT_SHARD_CONNECTIONS))]
+    async with httpx.AsyncClient(base_url=base, timeout=timeout) as client:
+        async def ask(i):
+            start = time.perf_counter()
+            try:
+                response = await shards[i % len(shards)].post(
+                    '/chat', json={'message': f'Question {i} about prenatal vitamins'})
+                outcome = response.status_code
+                if outcome == 200 and response.json().get('degraded'):
+                    outcome = 'degraded'
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            return outcome, time.perf_counter() - start
+
+        async def probe(done):
+            latencies = []
+            while not done.is_set():
+                start = time.perf_counter()
+                try:
+                    await client.get('/api/dashboard/stats')
+                except httpx.HTTPError:
+                    pass
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.2)
+            return latencies
+
+        done = asyncio.Event()
+        prober = asyncio.create_task(probe(done))
+        results = await asyncio.gather(*(ask(i) for i in range(connections)))
+        done.set()
+        probes = await prober
+    for shard in shards:
+        await shard.aclose()
+    answered = [latency for outcome, latency in results if outcome in (200, 'degraded')]
+    others = {}
+    for outcome, _ in results:
+        if outcome != 200:
+            others[outcome] = others.get(outcome, 0) + 1
+    return answered, others, probes
+
+def wait_for(url, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.1)
+
+def start_threaded(app, port, workers):
+    from benchmarks.chat_bulkhead import PooledWSGIServer
+
+    server = PooledWSGIServer('127.0.0.1', port, app, workers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+def start_async(port, wsgi_threads):
+    import async_server
+
+    server = async_server.create_server(wsgi_threads)
+    ready = threading.Event()
+    loop = asyncio.new_event_loop()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        task = loop.create_task(server.serve('127.0.0.1', port))
+        loop.call_soon(ready.set)
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    wait_for(f'http://127.0.0.1:{port}/api/dashboard/stats')
+    return lambda: loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(loop)])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--workers', type=int, default=32, help='threads of the threaded deployment')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='threads for non-chat routes in async mode')
+    parser.add_argument('--latency-ms', type=float, default=1000.0)
+    parser.add_argument('--timeout', type=float, default=30.0, help='client timeout per request')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--mock-port', type=int, default=8060)
+    args = parser.parse_args()
+
+    # The mock runs in its own process so its threads don't compete with the app's for the GIL
+    mock = subprocess.Popen([sys.executable, '-m', 'mock_openai_server', '--port', str(args.mock_port),
+                             '--latency-ms', str(args.latency_ms), '--token-delay-ms', '0'],
+                            stdout=subprocess.DEVNULL)
+    wait_for(f'http://127.0.0.1:{args.mock_port}/stats')
+    os.environ.update({
+        'OPENAI_BASE_URL': f'http://127.0.0.1:{args.mock_port}/v1',
+        # Threaded mode: one upstream call per worker, and requests queue for a worker instead of getting 503s
+        'CHAT_MAX_CONCURRENCY': str(args.workers),
+        'CHAT_ASYNC_MAX_CONCURRENCY': str(max(args.connections)),
+        'CHAT_QUEUE_TIMEOUT_MS': str(args.timeout * 1000),
+        'CHAT_TIMEOUT': str(args.timeout),
+        # Every question must go upstream
+        'CHAT_CACHE': '0', 'FAQ_RETRIEVAL': '0', 'CHAT_MEMORY': '0',
+    })
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    print(f'upstream latency {args.latency_ms:.0f} ms, client timeout {args.timeout:.0f} s')
+    print(f'{"mode":<24}{"conns":>6}{"answered":>9}{"failed":>8}{"wall s":>8}{"req/s":>8}'
+          f'{"p50 ms":>9}{"p99 ms":>9}{"probe p95":>11}')
+    modes = ((f'threaded ({args.workers} threads)', lambda port: start_threaded(app, port, args.workers)),
+             (f'async ({args.wsgi_threads} WSGI threads)', lambda port: start_async(port, args.wsgi_threads)))
+    for i, (label, start) in enumerate(modes):
+        port = args.port + i
+        stop = start(port)
+        for connections in args.connections:
+            began = time.perf_counter()
+            answered, others, probes = asyncio.run(flood(f'http://127.0.0.1:{port}', connections, args.timeout))
+            wall = time.perf_counter() - began
+            ms = np.array(answered or [0.0]) * 1000
+            probe_ms = np.array(probes or [0.0]) * 1000
+            print(f'{label:<24}{connections:>6}{len(answered):>9}{connections - len(answered):>8}{wall:>8.1f}'
+                  f'{len(answered) / wall:>8.1f}{np.percentile(ms, 50):>9.0f}{np.percentile(ms, 99):>9.0f}'
+                  f'{np.percentile(probe_ms, 95):>11.0f}')
+            if others:
+                print(f'{"":<24}not 200: {others}')
+        stop()
+    mock.terminate()
+
+if __name__ == '__main__':
+    main()
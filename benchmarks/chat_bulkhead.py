@@ -0,0 +1,126 @@
+"""Isolation test: other routes stay responsive while /chat's upstream is slow.
+
+Serves the app from a fixed pool of worker threads (like gunicorn --threads) with
+a deliberately slow mock OpenAI API, floods /chat, and probes a dashboard route.
+Run from the repository root, with and without an effective bulkhead:
+    python -m benchmarks.chat_bulkhead --workers 8 --max-concurrency 4
+    python -m benchmarks.chat_bulkhead --workers 8 --max-concurrency 1000
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from werkzeug.serving import BaseWSGIServer
+
+from mock_openai_server import MockConfig, make_server
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server with a fixed number of worker threads; extra connections wait in the pool queue."""
+
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app)
+        self._pool = ThreadPoolExecutor(workers)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def timed_request(url, payload=None, timeout=60):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 'timeout'
+    return status, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--max-concurrency', type=int, default=4)
+    parser.add_argument('--chat-clients', type=int, default=32)
+    parser.add_argument('--upstream-latency-ms', type=float, default=5000.0)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--port', type=int, default=8042)
+    parser.add_argument('--mock-port', type=int, default=8043)
+    args = parser.parse_args()
+
+    mock = make_server(args.mock_port, config=MockConfig(args.upstream_latency_ms, 0))
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    os.environ.update({
+        'OPENAI_BASE_URL': f'http://127.0.0.1:{args.mock_port}/v1',
+        'CHAT_MAX_CONCURRENCY': str(args.max_concurrency),
+        'CHAT_TIMEOUT': '30',
+        # Every question must go upstream
+        'CHAT_CACHE': '0', 'FAQ_RETRIEVAL': '0',
+    })
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = PooledWSGIServer('127.0.0.1', args.port, app, args.workers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{args.port}'
+    deadline = time.perf_counter() + args.duration
+    chat_statuses = Counter()
+    rejected_latencies = []
+    probe_latencies = []
+    lock = threading.Lock()
+
+    def chat_client(i):
+        n = 0
+        while time.perf_counter() < deadline:
+            status, elapsed = timed_request(f'{base}/chat', {'message': f'client {i} question {n}'})
+            n += 1
+            with lock:
+                chat_statuses[status] += 1
+                if status == 503:
+                    rejected_latencies.append(elapsed)
+            if status == 503:
+                time.sleep(1)
+
+    def prober():
+        while time.perf_counter() < deadline:
+            _, elapsed = timed_request(f'{base}/api/dashboard/stats', timeout=30)
+            probe_latencies.append(elapsed)
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=chat_client, args=(i,)) for i in range(args.chat_clients)]
+    threads.append(threading.Thread(target=prober))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    probe_ms = np.array(probe_latencies) * 1000
+    print(f'{args.workers} worker threads, chat bulkhead {args.max_concurrency}, '
+          f'upstream latency {args.upstream_latency_ms:.0f} ms, {args.chat_clients} chat clients')
+    print('chat responses:', dict(chat_statuses))
+    if rejected_latencies:
+        print(f'503 latency ms: p50 {np.percentile(rejected_latencies, 50) * 1000:.1f}')
+    print(f'/api/dashboard/stats during flood ({len(probe_ms)} probes) ms: p50 {np.percentile(probe_ms, 50):.1f}  '
+          f'p95 {np.percentile(probe_ms, 95):.1f}  max {probe_ms.max():.1f}')
+    server.shutdown()
+    mock.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark: upstream calls and latency for bursts of identical /chat questions, with and without coalescing.
+
+Starts mock_openai_server in-process, so no API key or network is needed. Run from the repository root:
+    python -m benchmarks.chat_coalescing --rounds 5 --concurrency 16 --latency-ms 300
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from mock_openai_server import MockConfig, make_server
+
+def burst(app, message, concurrency, stream):
+    def ask(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/chat', json={'message': message, 'stream': stream})
+        body = response.get_data(as_text=True)
+        return time.perf_counter() - start, response.status_code, body
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(ask, range(concurrency)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    parser.add_argument('--token-delay-ms', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8012)
+    args = parser.parse_args()
+
+    mock = make_server(args.port, config=MockConfig(args.latency_ms, args.token_delay_ms))
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{args.port}/v1'
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    # Each round asks a new question; the cache would otherwise answer every round after the first
+    os.environ.setdefault('CHAT_CACHE', '0')
+    os.environ.setdefault('CHAT_MAX_CONCURRENCY', str(args.concurrency))
+    os.environ.setdefault('CHAT_QUEUE_TIMEOUT_MS', '5000')
+    import app as chat_app
+    coalescer = chat_app.chat_service.coalescer
+    stats = mock.RequestHandlerClass.stats
+
+    print(f'{"mode":<22}{"upstream":>10}{"ok":>6}{"p50 ms":>9}{"p95 ms":>9}')
+    for label, enabled, stream in (('blocking, single', False, False), ('blocking, coalesced', True, False),
+                                   ('stream, single', False, True), ('stream, coalesced', True, True)):
+        chat_app.chat_service.coalescer = coalescer if enabled else None
+        before = stats.snapshot()['requests']
+        results = []
+        for round_number in range(args.rounds):
+            message = f'Is it safe to take a warm bath in late pregnancy? ({label} #{round_number})'
+            results.extend(burst(chat_app.app, message, args.concurrency, stream))
+        upstream = stats.snapshot()['requests'] - before
+        ms = np.array([seconds for seconds, _, _ in results]) * 1000
+        ok = sum(status == 200 for _, status, _ in results)
+        print(f'{label:<22}{upstream:>10}{ok:>6}{np.percentile(ms, 50):>9.1f}{np.percentile(ms, 95):>9.1f}')
+    print('coalescing:', coalescer.stats() if coalescer else None)
+    mock.shutdown()
+
+if __name__ == '__main__':
+    main()
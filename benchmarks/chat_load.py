@@ -0,0 +1,164 @@
+"""Load test: drive /chat at a target request rate and report throughput, latency percentiles and errors.
+
+Requests are sent open-loop: each is scheduled at a fixed time regardless of how slow earlier ones
+are, and latency is measured from that scheduled time, so a backed-up server shows up as latency
+instead of silently lowering the offered rate. Run from the repository root.
+
+Against the app and mock API started in-process (no API key or network needed):
+    python -m benchmarks.chat_load --rps 50 --duration 30 --latency-distribution lognormal --error-rate 0.02
+Against an already running app (pointed at the mock or the real API):
+    python -m benchmarks.chat_load --url http://127.0.0.1:5000 --rps 20 --duration 60 --stream
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from mock_openai_server import LATENCY_DISTRIBUTIONS, MockConfig, make_server
+
+QUESTIONS = [
+    'How much weight should I gain during pregnancy?',
+    'Is it normal to feel tired all the time in the second trimester?',
+    'When should my baby start eating solid food?',
+    'What are the warning signs of preeclampsia?',
+    'How can I ease back pain while pregnant?',
+    'How often should a newborn feed at night?',
+]
+
+def question(n, distinct):
+    """The n-th request's message; with distinct > 0 only that many different messages are used."""
+    if distinct:
+        n %= distinct
+    return f'{QUESTIONS[n % len(QUESTIONS)]} (case {n})'
+
+def send(url, message, stream, scheduled, timeout):
+    """POST one /chat request; return (outcome, latency, time to first byte) measured from `scheduled`."""
+    body = json.dumps({'message': message, 'stream': stream}).encode()
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    first_byte = None
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            first_line = response.readline()
+            first_byte = time.perf_counter() - scheduled
+            text = (first_line + response.read()).decode()
+    except urllib.error.HTTPError as e:
+        return e.code, time.perf_counter() - scheduled, first_byte
+    except OSError:
+        return 'connection_error', time.perf_counter() - scheduled, first_byte
+    latency = time.perf_counter() - scheduled
+    if stream:
+        if 'event: error' in text:
+            return 'stream_error', latency, first_byte
+        return ('degraded' if '"degraded": true' in text else 200), latency, first_byte
+    return ('degraded' if json.loads(text).get('degraded') else 200), latency, first_byte
+
+def run(url, rps, duration, stream, distinct, max_in_flight, timeout):
+    interval = 1 / rps
+    total = int(rps * duration)
+    results = []
+    lock = threading.Lock()
+
+    def task(n, scheduled):
+        result = send(url, question(n, distinct), stream, scheduled, timeout)
+        with lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_in_flight) as pool:
+        for n in range(total):
+            scheduled = start + n * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(task, n, scheduled)
+    return results, time.perf_counter() - start
+
+def report(results, elapsed, rps, stream):
+    outcomes = Counter(outcome for outcome, _, _ in results)
+    answered = [latency for outcome, latency, _ in results if outcome in (200, 'degraded')]
+    errors = len(results) - len(answered)
+    print(f'offered {rps:.1f} req/s, sent {len(results)} in {elapsed:.1f} s')
+    print(f'throughput {len(answered) / elapsed:.1f} answered req/s')
+    print(f'outcomes: {dict(outcomes)}')
+    print(f'error rate {errors / len(results):.2%}, degraded rate {outcomes["degraded"] / len(results):.2%}')
+    rows = [('latency', answered)]
+    if stream:
+        rows.append(('first byte', [first for outcome, _, first in results
+                                    if outcome in (200, 'degraded') and first is not None]))
+    print(f'{"ms":<14}{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}')
+    for name, values in rows:
+        if not values:
+            continue
+        ms = np.array(values) * 1000
+        print(f'{name:<14}{np.percentile(ms, 50):>9.1f}{np.percentile(ms, 95):>9.1f}'
+              f'{np.percentile(ms, 99):>9.1f}{ms.max():>9.1f}')
+
+def start_in_process(args):
+    """Start the mock API and the app (served by a fixed thread pool) and return the app's base URL."""
+    from benchmarks.chat_bulkhead import PooledWSGIServer
+
+    config = MockConfig(args.latency_ms, args.token_delay_ms, latency_distribution=args.latency_distribution,
+                        latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, disconnect_rate=args.disconnect_rate,
+                        seed=args.seed)
+    mock = make_server(args.mock_port, config=config)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{args.mock_port}/v1'
+    os.environ['CHAT_MAX_CONCURRENCY'] = str(args.max_concurrency)
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    if not args.local_answers:
+        # Measure the upstream path: every question goes to the mock
+        os.environ.update({'CHAT_CACHE': '0', 'FAQ_RETRIEVAL': '0'})
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = PooledWSGIServer('127.0.0.1', args.port, app, args.workers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{args.port}', mock
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running app; without it the app and mock run in-process')
+    parser.add_argument('--rps', type=float, default=20.0)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load')
+    parser.add_argument('--stream', action='store_true', help='request streamed answers')
+    parser.add_argument('--distinct', type=int, default=0,
+                        help='number of different questions to cycle through (0: every request is new)')
+    parser.add_argument('--max-in-flight', type=int, default=512, help='client-side cap on open requests')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    in_process = parser.add_argument_group('in-process app and mock API')
+    in_process.add_argument('--workers', type=int, default=32, help='app worker threads')
+    in_process.add_argument('--max-concurrency', type=int, default=32, help='chat bulkhead size')
+    in_process.add_argument('--local-answers', action='store_true',
+                            help='keep the FAQ and caches on instead of sending every question upstream')
+    in_process.add_argument('--port', type=int, default=8044)
+    in_process.add_argument('--mock-port', type=int, default=8045)
+    in_process.add_argument('--latency-ms', type=float, default=300.0)
+    in_process.add_argument('--token-delay-ms', type=float, default=10.0)
+    in_process.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    in_process.add_argument('--latency-jitter', type=float, default=0.5)
+    in_process.add_argument('--error-rate', type=float, default=0.0)
+    in_process.add_argument('--rate-limit-rate', type=float, default=0.0)
+    in_process.add_argument('--disconnect-rate', type=float, default=0.0)
+    in_process.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    mock = None
+    base = args.url.rstrip('/') if args.url else None
+    if base is None:
+        base, mock = start_in_process(args)
+    results, elapsed = run(f'{base}/chat', args.rps, args.duration, args.stream, args.distinct,
+                           args.max_in_flight, args.timeout)
+    report(results, elapsed, args.rps, args.stream)
+    if mock is not None:
+        print('mock upstream:', mock.RequestHandlerClass.stats.snapshot())
+        mock.shutdown()
+
+if __name__ == '__main__':
+    main()
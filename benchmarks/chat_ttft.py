@@ -0,0 +1,62 @@
+"""Benchmark: time-to-first-token of streamed /chat vs the blocking response, against the local mock API.
+
+Starts mock_openai_server in-process, so no API key or network is needed. Run from the repository root:
+    python -m benchmarks.chat_ttft --requests 20 --latency-ms 300 --token-delay-ms 20
+"""
+import argparse
+import os
+import threading
+import time
+import numpy as np
+
+from mock_openai_server import MockConfig, make_server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    parser.add_argument('--token-delay-ms', type=float, default=20.0)
+    parser.add_argument('--port', type=int, default=8011)
+    args = parser.parse_args()
+
+    mock = make_server(args.port, config=MockConfig(args.latency_ms, args.token_delay_ms))
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{args.port}/v1'
+    os.environ.setdefault('OPENAI_API_KEY', 'mock')
+    # Every question must go upstream
+    os.environ.update({'CHAT_CACHE': '0', 'FAQ_RETRIEVAL': '0', 'CHAT_COALESCING': '0'})
+    from app import app
+    client = app.test_client()
+    payload = {'message': 'What should I eat in the first trimester?'}
+
+    blocking, first_token, streamed = [], [], []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        client.post('/chat', json=payload).get_json()
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        response = client.post('/chat', json={**payload, 'stream': True}, buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        first_token.append(time.perf_counter() - start)
+        for _ in chunks:
+            pass
+        streamed.append(time.perf_counter() - start)
+
+    print(f'{"ms":<28}{"p50":>8}{"p95":>8}')
+    for name, values in (('blocking response', blocking), ('streamed first token', first_token),
+                         ('streamed last token', streamed)):
+        ms = np.array(values) * 1000
+        print(f'{name:<28}{np.percentile(ms, 50):>8.1f}{np.percentile(ms, 95):>8.1f}')
+
+    # A client that disconnects after the first token should cancel the upstream stream
+    response = client.post('/chat', json={**payload, 'stream': True}, buffered=False)
+    next(iter(response.response))
+    response.close()
+    time.sleep(0.5)
+    print('mock upstream:', mock.RequestHandlerClass.stats.snapshot())
+    mock.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Load test: micro-batched vs per-request maternal risk predictions.
+
+Run from the repository root:
+    python -m benchmarks.inference_batching --threads 32 --requests 4000
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from inference_scheduler import InferenceScheduler
+from model_utils import predict_risk
+
+def build_model():
+    X = np.random.rand(2000, 5)
+    y = (X[:, 2] + X[:, 4] > 1).astype(int)
+    scaler = StandardScaler()
+    model = RandomForestClassifier(n_estimators=100, n_jobs=1)
+    model.fit(scaler.fit_transform(X), y)
+    return model, scaler
+
+def run_load(predict_one, threads, requests):
+    rows = np.random.rand(requests, 5).tolist()
+    latencies = [0.0] * requests
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            predict_one(rows[i])
+            latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    lat_ms = np.array(latencies) * 1000
+    return {
+        'throughput': requests / elapsed,
+        'p50': np.percentile(lat_ms, 50),
+        'p95': np.percentile(lat_ms, 95),
+        'p99': np.percentile(lat_ms, 99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    parser.add_argument('--max-batch', type=int, default=64)
+    args = parser.parse_args()
+
+    model, scaler = build_model()
+
+    def predict_batch(rows):
+        return predict_risk(model, scaler, rows)
+
+    scheduler = InferenceScheduler(predict_batch, window=args.window_ms / 1000,
+                                   max_batch_size=args.max_batch, timeout=5.0)
+    modes = [
+        ('per-request', lambda row: predict_batch([row])[0]),
+        ('micro-batched', scheduler.predict),
+    ]
+    print(f'{args.requests} requests over {args.threads} threads')
+    print(f'{"mode":<15}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for name, predict_one in modes:
+        r = run_load(predict_one, args.threads, args.requests)
+        print(f'{name:<15}{r["throughput"]:>10.0f}{r["p50"]:>10.2f}{r["p95"]:>10.2f}{r["p99"]:>10.2f}')
+    print('scheduler stats:', scheduler.stats())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Load generator: sustained readings/sec through the bulk vitals ingestion endpoint.
+
+Simulates devices posting NDJSON batches and honouring 429 + Retry-After.
+Start the app first with an ingestion key (INGEST_API_KEY=... python app.py),
+then from the repository root:
+    python -m benchmarks.ingest_load --api-key ... --devices 8 --lines 2000 --duration 30
+Readings go to patient ids 1..--patients, which must exist; unknown ids are rejected.
+Every reading gets its own measured_at second from the start of the run, since a
+reading resent for the same patient and second is only stored once.
+"""
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+import numpy as np
+
+def make_body(rng, patients, lines, seconds):
+    ids = rng.integers(1, patients + 1, lines)
+    vitals = rng.normal([28, 24, 118, 11.5, 100], [6, 4, 15, 1.5, 25], (lines, 5))
+    return [json.dumps({'patient_id': int(pid),
+                        'measured_at': datetime.fromtimestamp(next(seconds), timezone.utc).isoformat(),
+                        'age': round(v[0]), 'bmi': round(v[1], 1),
+                        'bp': round(v[2]), 'hb': round(v[3], 1), 'sugar': round(v[4])})
+            for pid, v in zip(ids, vitals)]
+
+def post(url, lines, api_key):
+    request = urllib.request.Request(url, data=('\n'.join(lines) + '\n').encode(), method='POST',
+                                     headers={'Content-Type': 'application/x-ndjson'})
+    if api_key:
+        request.add_header('X-Api-Key', api_key)
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, json.load(response), None
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e), e.headers.get('Retry-After')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/vitals/ingest')
+    parser.add_argument('--api-key', default=os.getenv('INGEST_API_KEY'))
+    parser.add_argument('--devices', type=int, default=8)
+    parser.add_argument('--lines', type=int, default=2000, help='readings per request')
+    parser.add_argument('--patients', type=int, default=18, help='highest patient id (18 are seeded)')
+    parser.add_argument('--duration', type=float, default=30.0)
+    args = parser.parse_args()
+
+    totals = {'accepted': 0, 'rejected': 0, 'requests': 0, 'throttled': 0, 'errors': 0}
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    first_second = int(time.time())
+
+    def device(seed):
+        rng = np.random.default_rng(seed)
+        # Devices take turns through the seconds so no two readings share one
+        seconds = itertools.count(first_second + seed, args.devices)
+        lines = make_body(rng, args.patients, args.lines, seconds)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status, body, retry_after = post(args.url, lines, args.api_key)
+            except (OSError, ValueError):
+                with lock:
+                    totals['errors'] += 1
+                time.sleep(0.5)
+                continue
+            elapsed = time.perf_counter() - start
+            acks = body.get('acks', [])
+            with lock:
+                totals['requests'] += 1
+                totals['accepted'] += sum(ack['accepted'] for ack in acks)
+                totals['rejected'] += sum(len(ack['rejected']) for ack in acks)
+                latencies.append(elapsed)
+                if status == 429:
+                    totals['throttled'] += 1
+                elif status != 200:
+                    totals['errors'] += 1
+            if status == 429:
+                # Only resend the part the server refused
+                resume = body['resume_from_line']
+                time.sleep(float(retry_after or 1))
+                lines = lines[resume - 1:]
+            else:
+                lines = make_body(rng, args.patients, args.lines, seconds)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=device, args=(seed,)) for seed in range(args.devices)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat_ms = np.array(latencies or [0.0]) * 1000
+    print(f'{args.devices} devices x {args.lines} readings/request for {elapsed:.1f}s')
+    print(f'sustained: {totals["accepted"] / elapsed:,.0f} readings/s')
+    print(f'requests: {totals["requests"]}  throttled (429): {totals["throttled"]}  '
+          f'errors: {totals["errors"]}  rejected lines: {totals["rejected"]}')
+    print(f'request latency ms: p50 {np.percentile(lat_ms, 50):.1f}  '
+          f'p95 {np.percentile(lat_ms, 95):.1f}  p99 {np.percentile(lat_ms, 99):.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark: per-call overhead of the Unix-socket model server vs in-process predict.
+
+Needs trained artifacts in models/ (python train_model.py). Run from the repository root:
+    python -m benchmarks.model_server_overhead
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from model_server import ModelClient
+from model_utils import get_current_models, predict_risk
+
+def time_calls(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=64)
+    args = parser.parse_args()
+
+    model, scaler, _ = get_current_models()
+    if model is None:
+        sys.exit('No model in models/; run python train_model.py first.')
+
+    socket_path = os.path.join(tempfile.mkdtemp(), 'model.sock')
+    server = subprocess.Popen([sys.executable, 'model_server.py', '--socket', socket_path],
+                              stdout=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        client = ModelClient(socket_path, timeout=5.0)
+        rows = np.random.default_rng(0).normal([28, 24, 118, 11.5, 100], [6, 4, 15, 1.5, 25], (args.batch, 5))
+        row = rows[:1].tolist()
+        batch = rows.tolist()
+
+        print(f'{"call":<18}{"in-process ms":>15}{"server ms":>12}{"overhead ms":>13}')
+        for name, data in (('single row', row), (f'batch of {args.batch}', batch)):
+            local = time_calls(lambda: predict_risk(model, scaler, data), args.repeats)
+            remote = time_calls(lambda: client.predict(data), args.repeats)
+            print(f'{name:<18}{local:>15.3f}{remote:>12.3f}{remote - local:>13.3f}')
+        print('client stats:', client.stats())
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    main()
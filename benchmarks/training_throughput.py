@@ -0,0 +1,43 @@
+"""Benchmark: training throughput on synthetic vitals, single core vs all cores.
+
+Run from the repository root:
+    python -m benchmarks.training_throughput --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from model_utils import FEATURE_NAMES, iter_csv_chunks, iter_synthetic_chunks, train_from_chunks
+
+def write_csv(path, rows, chunk_size):
+    with open(path, 'w') as f:
+        f.write(','.join(FEATURE_NAMES + ['label']) + '\n')
+        for X, y in iter_synthetic_chunks(rows, chunk_size):
+            np.savetxt(f, np.column_stack([X, y]), delimiter=',', fmt='%.2f')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--n-estimators', type=int, default=50)
+    parser.add_argument('--max-depth', type=int, default=12)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'vitals.csv')
+        start = time.perf_counter()
+        write_csv(csv_path, args.rows, args.chunk_size)
+        print(f'wrote {args.rows} rows in {time.perf_counter() - start:.1f}s')
+
+        print(f'{"n_jobs":>8}{"load s":>10}{"scale s":>10}{"fit s":>10}{"rows/s":>12}')
+        for n_jobs in (1, -1):
+            _, _, r = train_from_chunks(iter_csv_chunks(csv_path, args.chunk_size),
+                                        n_estimators=args.n_estimators, max_depth=args.max_depth,
+                                        n_jobs=n_jobs, random_state=0)
+            print(f'{r["n_jobs"]:>8}{r["load_seconds"]:>10.2f}{r["scale_seconds"]:>10.2f}'
+                  f'{r["fit_seconds"]:>10.2f}{r["rows_per_second"]:>12.0f}')
+
+if __name__ == '__main__':
+    main()
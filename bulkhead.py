@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+class BulkheadFull(Exception):
+    pass
+
+class Bulkhead:
+    """Caps how many threads may be inside one dependency at a time.
+
+    Callers over the limit wait at most max_wait seconds for a slot and then
+    get BulkheadFull, so a slow dependency can tie up at most max_concurrent
+    worker threads instead of all of them.
+    """
+
+    def __init__(self, max_concurrent, max_wait=0.0):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if self.max_wait > 0:
+            acquired = self._semaphore.acquire(timeout=self.max_wait)
+        else:
+            acquired = self._semaphore.acquire(blocking=False)
+        with self._lock:
+            if not acquired:
+                self.rejected += 1
+                raise BulkheadFull()
+            self.admitted += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'in_flight': self.in_flight,
+                'peak': self.peak,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
+class AsyncBulkhead:
+    """Bulkhead for coroutines on one event loop.
+
+    Same limits and stats as Bulkhead, but a caller waiting for a slot is a
+    suspended coroutine rather than a blocked thread.
+    """
+
+    def __init__(self, max_concurrent, max_wait=0.0):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = asyncio.BoundedSemaphore(max_concurrent)
+        self.in_flight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.max_wait <= 0:
+            self.rejected += 1
+            raise BulkheadFull()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait or None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BulkheadFull() from None
+        self.admitted += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        # Plain reads; the counters only change on the loop's thread
+        return {
+            'max_concurrent': self.max_concurrent,
+            'in_flight': self.in_flight,
+            'peak': self.peak,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
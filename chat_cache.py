@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from faq_retrieval import tokenize
+
+CHAT_CACHE_PATH = os.getenv('CHAT_CACHE_PATH', 'chat_cache.db')
+CHAT_CACHE_TTL = float(os.getenv('CHAT_CACHE_TTL', str(7 * 24 * 3600)))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', '10000'))
+# Eviction scans the table, so run it every N writes rather than on each one
+EVICTION_INTERVAL = 64
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+
+def normalize_message(message):
+    """The form of a chat message that cached answers are keyed on.
+
+    It is the message's content words as a set: case, punctuation, stopwords,
+    word order and plural/-ing endings are ignored, so "is fish safe while
+    pregnant?" and "pregnant - fish safe?" share an entry. Every other word
+    must match, so a question that adds a qualifier ("raw fish"), a negation
+    ("not safe") or another drug or condition gets its own entry. A message
+    without content words keeps its case- and punctuation-insensitive text.
+    """
+    terms = sorted(set(tokenize(message)))
+    if terms:
+        return ' '.join(terms)
+    return ' '.join(_NON_WORD.sub(' ', message.lower()).split())
+
+def cache_key(message, system_prompt, model):
+    text = '\0'.join((model, system_prompt, normalize_message(message)))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text
+    return max(1, len(text) // 4)
+
+class ChatResponseCache:
+    """Persistent chat answer cache in SQLite, shared by every worker using the same file.
+
+    Entries expire `ttl` seconds after they are written; beyond `max_entries`
+    the least recently used are evicted. Each entry keeps the token usage and
+    latency of the call that produced it, so hits can report what they saved.
+    """
+
+    def __init__(self, path=CHAT_CACHE_PATH, ttl=CHAT_CACHE_TTL, max_entries=CHAT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.latency_saved = 0.0
+        self.tokens_saved = 0
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                latency REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_responses_last_used ON chat_responses (last_used)')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            # WAL lets workers read while another one writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the cached answer for key, or None on a miss."""
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            'SELECT response, created_at, prompt_tokens, completion_tokens, latency '
+            'FROM chat_responses WHERE key = ?', (key,)).fetchone()
+        if row is not None and now - row[1] > self.ttl:
+            conn.execute('DELETE FROM chat_responses WHERE key = ?', (key,))
+            conn.commit()
+            with self._lock:
+                self.expired += 1
+            row = None
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        conn.execute('UPDATE chat_responses SET last_used = ? WHERE key = ?', (now, key))
+        conn.commit()
+        response, _, prompt_tokens, completion_tokens, latency = row
+        with self._lock:
+            self.hits += 1
+            self.latency_saved += latency
+            self.tokens_saved += prompt_tokens + completion_tokens
+        return response
+
+    def put(self, key, response, prompt_tokens, completion_tokens, latency):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO chat_responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (key, response, now, now, prompt_tokens, completion_tokens, latency))
+        conn.commit()
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        conn = self._connection()
+        expired = conn.execute('DELETE FROM chat_responses WHERE created_at < ?',
+                               (time.time() - self.ttl,)).rowcount
+        evicted = conn.execute('''
+            DELETE FROM chat_responses WHERE key IN (
+                SELECT key FROM chat_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,)).rowcount
+        conn.commit()
+        with self._lock:
+            self.expired += expired
+            self.evictions += evicted
+
+    def stats(self):
+        entries = self._connection().execute('SELECT COUNT(*) FROM chat_responses').fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'latency_saved_seconds': self.latency_saved,
+                'tokens_saved': self.tokens_saved,
+            }
@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from chat_cache import estimate_tokens
+
+CHAT_MEMORY_PATH = os.getenv('CHAT_MEMORY_PATH', 'chat_memory.db')
+# Past conversation sent with each message, on top of the system prompt and the new message
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', '1000'))
+CHAT_SUMMARY_TOKEN_BUDGET = 150
+CHAT_SESSION_TTL = float(os.getenv('CHAT_SESSION_TTL', str(24 * 3600)))
+# Role and separator tokens the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_QUESTION_CHARS = 120
+PURGE_INTERVAL = 256
+
+def message_tokens(content):
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+class ChatMemory:
+    """Server-side multi-turn history per chat session, kept within a token budget.
+
+    Recent turns are sent verbatim, newest first until the budget is spent.
+    Turns that no longer fit are folded into a short local summary of the
+    questions asked earlier (no extra API call) and deleted, so both the
+    prompt and the stored history stay bounded.
+    """
+
+    def __init__(self, path=CHAT_MEMORY_PATH, token_budget=CHAT_HISTORY_TOKEN_BUDGET,
+                 summary_budget=CHAT_SUMMARY_TOKEN_BUDGET, session_ttl=CHAT_SESSION_TTL):
+        self.path = path
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.session_ttl = session_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.compactions = 0
+        self.turns_summarized = 0
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '[]',  -- JSON list of earlier questions, oldest first
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_turns_session ON chat_turns (session_id, id)')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def has_history(self, session_id):
+        row = self._connection().execute(
+            'SELECT 1 FROM chat_sessions WHERE session_id = ?', (session_id,)).fetchone()
+        return row is not None
+
+    def _summary_text(self, questions):
+        return 'Earlier in this conversation the user asked: ' + '; '.join(questions)
+
+    def _compact(self, conn, session_id, questions, dropped):
+        for _, role, content, _ in dropped:
+            if role == 'user':
+                questions.append(content[:SUMMARY_QUESTION_CHARS])
+        # Keep the most recent questions that fit the summary budget
+        while len(questions) > 1 and estimate_tokens(self._summary_text(questions)) > self.summary_budget:
+            questions.pop(0)
+        conn.execute('UPDATE chat_sessions SET summary = ? WHERE session_id = ?', (json.dumps(questions), session_id))
+        conn.execute('DELETE FROM chat_turns WHERE session_id = ? AND id <= ?', (session_id, dropped[-1][0]))
+        conn.commit()
+        with self._lock:
+            self.compactions += 1
+            self.turns_summarized += len(dropped)
+        return questions
+
+    def build_messages(self, session_id, system_prompt, user_message):
+        """Chat messages for the next request: system prompt (+ summary), recent turns, then the new message."""
+        conn = self._connection()
+        row = conn.execute('SELECT summary FROM chat_sessions WHERE session_id = ?', (session_id,)).fetchone()
+        questions = json.loads(row[0]) if row else []
+        turns = conn.execute('SELECT id, role, content, tokens FROM chat_turns WHERE session_id = ? ORDER BY id',
+                             (session_id,)).fetchall()
+        used = 0
+        kept = len(turns)
+        while kept and used + turns[kept - 1][3] <= self.token_budget:
+            kept -= 1
+            used += turns[kept][3]
+        # Cut on a user turn so the model never sees an answer without its question
+        while kept < len(turns) and turns[kept][1] != 'user':
+            kept += 1
+        if kept:
+            questions = self._compact(conn, session_id, questions, turns[:kept])
+        system = system_prompt
+        if questions:
+            system = f'{system_prompt}\n\n{self._summary_text(questions)}'
+        messages = [{"role": "system", "content": system}]
+        messages.extend({"role": role, "content": content} for _, role, content, _ in turns[kept:])
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def append(self, session_id, user_message, answer):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('INSERT INTO chat_sessions (session_id, updated_at) VALUES (?, ?) '
+                     'ON CONFLICT (session_id) DO UPDATE SET updated_at = excluded.updated_at', (session_id, now))
+        conn.executemany('INSERT INTO chat_turns (session_id, role, content, tokens) VALUES (?, ?, ?, ?)', [
+            (session_id, 'user', user_message, message_tokens(user_message)),
+            (session_id, 'assistant', answer, message_tokens(answer)),
+        ])
+        conn.commit()
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % PURGE_INTERVAL == 0
+        if purge:
+            self.purge()
+
+    def clear(self, session_id):
+        conn = self._connection()
+        conn.execute('DELETE FROM chat_turns WHERE session_id = ?', (session_id,))
+        conn.execute('DELETE FROM chat_sessions WHERE session_id = ?', (session_id,))
+        conn.commit()
+
+    def purge(self):
+        """Drop sessions idle for longer than session_ttl."""
+        conn = self._connection()
+        cutoff = time.time() - self.session_ttl
+        conn.execute('DELETE FROM chat_turns WHERE session_id IN '
+                     '(SELECT session_id FROM chat_sessions WHERE updated_at < ?)', (cutoff,))
+        conn.execute('DELETE FROM chat_sessions WHERE updated_at < ?', (cutoff,))
+        conn.commit()
+
+    def stats(self):
+        conn = self._connection()
+        sessions = conn.execute('SELECT COUNT(*) FROM chat_sessions').fetchone()[0]
+        turns = conn.execute('SELECT COUNT(*) FROM chat_turns').fetchone()[0]
+        with self._lock:
+            return {
+                'sessions': sessions,
+                'stored_turns': turns,
+                'token_budget': self.token_budget,
+                'compactions': self.compactions,
+                'turns_summarized': self.turns_summarized,
+            }
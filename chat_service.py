@@ -0,0 +1,528 @@
+import asyncio
+import itertools
+import os
+import time
+from contextlib import nullcontext
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from chat_cache import cache_key, estimate_tokens
+from chat_memory import message_tokens
+from metrics_utils import TOKEN_BUCKETS, Histogram, LatencyHistogram
+
+CHAT_MODEL = 'gpt-3.5-turbo'
+CHAT_MAX_TOKENS = 500
+CHAT_TEMPERATURE = 0.7
+# Upstream calls allowed at once per worker; keep it below the server's thread count
+CHAT_MAX_CONCURRENCY = int(os.getenv('CHAT_MAX_CONCURRENCY', '8'))
+# In async mode a waiting call holds no thread, so far more may be in flight
+CHAT_ASYNC_MAX_CONCURRENCY = int(os.getenv('CHAT_ASYNC_MAX_CONCURRENCY', '1000'))
+CHAT_ASYNC_SHARD_CONNECTIONS = 64
+# How long a request may wait for a free slot before getting a 503
+CHAT_QUEUE_TIMEOUT = float(os.getenv('CHAT_QUEUE_TIMEOUT_MS', '100')) / 1000
+# Total time for a blocking call; for streams it bounds the wait between chunks
+CHAT_TIMEOUT = float(os.getenv('CHAT_TIMEOUT', '20'))
+CHAT_CONNECT_TIMEOUT = 3.0
+CHAT_MAX_RETRIES = int(os.getenv('CHAT_MAX_RETRIES', '1'))
+# Circuit breaker: open at this upstream failure share over the window, probe again after the reset timeout
+CHAT_BREAKER_FAILURE_RATE = float(os.getenv('CHAT_BREAKER_FAILURE_RATE', '0.5'))
+CHAT_BREAKER_MIN_CALLS = int(os.getenv('CHAT_BREAKER_MIN_CALLS', '10'))
+CHAT_BREAKER_WINDOW = float(os.getenv('CHAT_BREAKER_WINDOW', '60'))
+CHAT_BREAKER_RESET_TIMEOUT = float(os.getenv('CHAT_BREAKER_RESET_TIMEOUT', '30'))
+FALLBACK_MESSAGE = ("I'm having trouble reaching the assistant right now, so I can't answer this question "
+                    "at the moment. Please try again in a few minutes. If you have an urgent concern, "
+                    "contact your doctor or the nearest health facility right away.")
+
+# System prompt for health-focused AI
+SYSTEM_PROMPT = """You are a helpful AI health assistant specializing in maternal and child care. You provide accurate, evidence-based information about:
+
+- Pregnancy and prenatal care
+- Child development and growth
+- Nutrition for mothers and children
+- Common health concerns and preventive care
+- General wellness advice
+
+Important guidelines:
+- Always emphasize consulting healthcare professionals for medical advice
+- Provide general information, not personalized medical diagnoses
+- Be supportive and encouraging
+- Use clear, simple language
+- If asked about serious medical conditions, recommend seeing a doctor
+
+Remember: You are not a substitute for professional medical care."""
+
+def chat_messages(user_message, system_prompt=SYSTEM_PROMPT):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+
+def make_openai_client():
+    """One OpenAI client per process over a pooled HTTP client sized to the bulkhead."""
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=CHAT_MAX_CONCURRENCY, max_keepalive_connections=CHAT_MAX_CONCURRENCY),
+        timeout=httpx.Timeout(CHAT_TIMEOUT, connect=CHAT_CONNECT_TIMEOUT),
+    )
+    return OpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        http_client=http_client,
+        timeout=httpx.Timeout(CHAT_TIMEOUT, connect=CHAT_CONNECT_TIMEOUT),
+        max_retries=CHAT_MAX_RETRIES,
+    )
+
+def make_async_openai_clients():
+    """AsyncOpenAI clients for the event loop, together pooled to the async bulkhead's size.
+
+    httpcore's pool does work proportional to its queued requests times its
+    connections on every change, which turns quadratic with a thousand calls
+    in flight; several small pools used in turn keep that cost flat.
+    """
+    shards = -(-CHAT_ASYNC_MAX_CONCURRENCY // CHAT_ASYNC_SHARD_CONNECTIONS)
+    clients = []
+    for _ in range(shards):
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=CHAT_ASYNC_SHARD_CONNECTIONS,
+                                max_keepalive_connections=CHAT_ASYNC_SHARD_CONNECTIONS),
+            timeout=httpx.Timeout(CHAT_TIMEOUT, connect=CHAT_CONNECT_TIMEOUT),
+        )
+        clients.append(AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            http_client=http_client,
+            timeout=httpx.Timeout(CHAT_TIMEOUT, connect=CHAT_CONNECT_TIMEOUT),
+            max_retries=CHAT_MAX_RETRIES,
+        ))
+    return clients
+
+def is_upstream_failure(error):
+    """True for errors that mean the API is unhealthy, as opposed to a bad request."""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    # A stream cut off mid-response surfaces as a raw httpx error, not an APIError
+    return isinstance(error, (openai.APIError, httpx.TransportError))
+
+class ChatService:
+    """Answers /chat messages through the OpenAI client, blocking or token by token.
+
+    Questions confidently matched by the FAQ index are answered locally without
+    an API call. With a ChatResponseCache, repeated questions are answered from
+    it and new answers are stored once complete; rewordings with the same
+    content words share an entry (see chat_cache.normalize_message).
+
+    Upstream calls (not local answers) go through the bulkhead, which raises
+    BulkheadFull when too many are already in flight, and the circuit breaker,
+    which raises CircuitOpen while the API is failing. fallback_answer() gives
+    the best local answer for when the API can't be used.
+
+    With a ChatMemory and a session id, earlier turns of the conversation are
+    sent along within the memory's token budget.
+
+    With a SingleFlight coalescer, identical cacheable questions arriving while
+    one is already being answered upstream share that call instead of making
+    their own; streams fan the same tokens out to every waiting client.
+    """
+
+    def __init__(self, client, model=CHAT_MODEL, system_prompt=SYSTEM_PROMPT, cache=None, faq=None,
+                 bulkhead=None, breaker=None, memory=None, coalescer=None):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.cache = cache
+        self.faq = faq
+        self.bulkhead = bulkhead
+        self.breaker = breaker
+        self.memory = memory
+        self.coalescer = coalescer
+        self.latency = LatencyHistogram()
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS, unit='tokens')
+        self.time_to_first_token = LatencyHistogram()
+        self.requests = 0
+        self.streams = 0
+        self.cancelled_streams = 0
+        self.errors = 0
+        self.fallbacks = 0
+
+    def _record(self, error=None):
+        if self.breaker is not None:
+            self.breaker.record(error is None or not is_upstream_failure(error))
+
+    def _release(self):
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def _faq_answer(self, user_message):
+        if self.faq is None:
+            return None
+        entry = self.faq.answer(user_message)
+        return entry['answer'] if entry else None
+
+    def _cached(self, key):
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            print(f"Error reading chat cache: {e}")
+            return None
+
+    def _store(self, key, answer, prompt_tokens, completion_tokens, latency):
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(key, answer, prompt_tokens, completion_tokens, latency)
+        except Exception as e:
+            print(f"Error writing chat cache: {e}")
+
+    def _local_answer(self, user_message, session_id):
+        """Return (answer or None, cache key or None) from the FAQ and caches.
+
+        Mid-conversation, a message may depend on earlier turns, so only the
+        FAQ (which needs the message itself to match confidently) is used and
+        the answer is not cached.
+        """
+        answer = self._faq_answer(user_message)
+        if answer is not None:
+            return answer, None
+        if self.memory is not None and session_id and self.memory.has_history(session_id):
+            return None, None
+        key = cache_key(user_message, self.system_prompt, self.model)
+        return self._cached(key), key
+
+    def _messages(self, user_message, session_id):
+        if self.memory is not None and session_id:
+            messages = self.memory.build_messages(session_id, self.system_prompt, user_message)
+        else:
+            messages = chat_messages(user_message, self.system_prompt)
+        self.prompt_tokens.observe(sum(message_tokens(m['content']) for m in messages))
+        return messages
+
+    def _remember(self, session_id, user_message, answer):
+        if self.memory is None or not session_id:
+            return
+        try:
+            self.memory.append(session_id, user_message, answer)
+        except Exception as e:
+            print(f"Error saving chat history: {e}")
+
+    def complete(self, user_message, session_id=None):
+        """Return the full answer text."""
+        self.requests += 1
+        answer, key = self._local_answer(user_message, session_id)
+        if answer is None and key is not None and self.coalescer is not None:
+            answer = self.coalescer.do(key, lambda: self._complete_upstream(user_message, session_id, key))
+        elif answer is None:
+            answer = self._complete_upstream(user_message, session_id, key)
+        self._remember(session_id, user_message, answer)
+        return answer
+
+    def _complete_upstream(self, user_message, session_id, key):
+        messages = self._messages(user_message, session_id)
+        with self.bulkhead.slot() if self.bulkhead else nullcontext():
+            if self.breaker:
+                self.breaker.allow()
+            start = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=CHAT_MAX_TOKENS,
+                    temperature=CHAT_TEMPERATURE
+                )
+            except Exception as e:
+                self.errors += 1
+                self._record(e)
+                raise
+            except BaseException:
+                # Interrupted before any outcome
+                self._release()
+                raise
+            self._record()
+        latency = time.perf_counter() - start
+        self.latency.observe(latency)
+        answer = response.choices[0].message.content.strip()
+        if key is not None:
+            self._store_response(key, user_message, answer, response.usage, latency)
+        return answer
+
+    def _store_response(self, key, user_message, answer, usage, latency):
+        # Streamed responses carry no usage, so their token counts are estimated
+        if usage:
+            self._store(key, answer, usage.prompt_tokens, usage.completion_tokens, latency)
+        else:
+            self._store(key, answer, estimate_tokens(self.system_prompt + user_message), estimate_tokens(answer),
+                        latency)
+
+    def stream(self, user_message, session_id=None):
+        """Yield answer tokens as the API produces them.
+
+        Closing the generator early (e.g. the browser disconnected) closes the
+        upstream HTTP response, which cancels generation on the API side.
+        """
+        self.streams += 1
+        answer, key = self._local_answer(user_message, session_id)
+        if answer is not None:
+            yield answer
+            self._remember(session_id, user_message, answer)
+            return
+        if key is not None and self.coalescer is not None:
+            tokens = self.coalescer.stream(key, lambda: self._upstream_tokens(user_message, session_id, key))
+        else:
+            tokens = self._upstream_tokens(user_message, session_id, key)
+        received = []
+        try:
+            for token in tokens:
+                received.append(token)
+                yield token
+        finally:
+            tokens.close()
+        self._remember(session_id, user_message, ''.join(received).strip())
+
+    def _upstream_tokens(self, user_message, session_id, key):
+        messages = self._messages(user_message, session_id)
+        if self.bulkhead:
+            self.bulkhead.acquire()
+        try:
+            yield from self._stream_upstream(messages, user_message, key)
+        finally:
+            if self.bulkhead:
+                self.bulkhead.release()
+
+    def _stream_upstream(self, messages, user_message, key):
+        if self.breaker:
+            self.breaker.allow()
+        start = time.perf_counter()
+        try:
+            upstream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=CHAT_MAX_TOKENS,
+                temperature=CHAT_TEMPERATURE,
+                stream=True
+            )
+        except Exception as e:
+            self.errors += 1
+            self._record(e)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        first = True
+        finished = False
+        tokens = []
+        try:
+            for chunk in upstream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if not token:
+                    continue
+                if first:
+                    self.time_to_first_token.observe(time.perf_counter() - start)
+                    first = False
+                tokens.append(token)
+                yield token
+            finished = True
+            self._record()
+            latency = time.perf_counter() - start
+            self.latency.observe(latency)
+            answer = ''.join(tokens).strip()
+            if key is not None:
+                self._store_response(key, user_message, answer, None, latency)
+        except GeneratorExit:
+            # The client left; the API itself was fine
+            self.cancelled_streams += 1
+            self._record()
+            raise
+        except Exception as e:
+            self.errors += 1
+            self._record(e)
+            raise
+        finally:
+            if not finished:
+                upstream.response.close()
+
+    def fallback_answer(self, user_message):
+        """Best local answer without calling the API, else a notice.
+
+        Only answers to the same question are given: an FAQ entry or a cached
+        question with exactly the same content words. A merely similar medical
+        question can need a different answer.
+        """
+        self.fallbacks += 1
+        if self.faq is not None:
+            entry = self.faq.exact_match(user_message)
+            if entry is not None:
+                return entry['answer']
+        answer = self._cached(cache_key(user_message, self.system_prompt, self.model))
+        return FALLBACK_MESSAGE if answer is None else answer
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'streams': self.streams,
+            'cancelled_streams': self.cancelled_streams,
+            'errors': self.errors,
+            'fallbacks': self.fallbacks,
+            'latency': self.latency.stats(),
+            'time_to_first_token': self.time_to_first_token.stats(),
+            'prompt_tokens': self.prompt_tokens.stats(),
+            'cache': self.cache.stats() if self.cache else None,
+            'faq': self.faq.stats() if self.faq else None,
+            'bulkhead': self.bulkhead.stats() if self.bulkhead else None,
+            'circuit_breaker': self.breaker.stats() if self.breaker else None,
+            'memory': self.memory.stats() if self.memory else None,
+            'coalescing': self.coalescer.stats() if self.coalescer else None,
+        }
+
+class AsyncChatService(ChatService):
+    """ChatService for an asyncio event loop, over AsyncOpenAI clients used in turn.
+
+    complete() is a coroutine and stream() an async generator. A request
+    waiting on the API holds no thread, so one loop can keep thousands in
+    flight; bulkhead must be an AsyncBulkhead and coalescer an
+    AsyncSingleFlight. FAQ, cache and memory lookups touch SQLite and run on
+    the loop's default executor. Needs Python 3.11 (Task.cancelling); the
+    threaded ChatService does not.
+    """
+
+    def __init__(self, clients, **kwargs):
+        super().__init__(clients[0], **kwargs)
+        self._clients = itertools.cycle(clients)
+
+    async def _create(self, **params):
+        """chat.completions.create in a child task.
+
+        anyio 3 (which openai 1.3 pins) can deliver a timed-out cancel scope's
+        cancellation after the scope has exited, typically when connects time
+        out under a burst. Inside a child task that stray CancelledError stays
+        contained and is reported as a timeout instead of tearing down the
+        request; a real cancellation of this task still propagates.
+        """
+        client = next(self._clients)
+        call = asyncio.ensure_future(client.chat.completions.create(**params))
+        try:
+            return await call
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            raise openai.APITimeoutError(httpx.Request('POST', f'{client.base_url}chat/completions')) from None
+
+    async def complete(self, user_message, session_id=None):
+        self.requests += 1
+        answer, key = await asyncio.to_thread(self._local_answer, user_message, session_id)
+        if answer is None and key is not None and self.coalescer is not None:
+            answer = await self.coalescer.do(key, lambda: self._complete_upstream(user_message, session_id, key))
+        elif answer is None:
+            answer = await self._complete_upstream(user_message, session_id, key)
+        await asyncio.to_thread(self._remember, session_id, user_message, answer)
+        return answer
+
+    async def _complete_upstream(self, user_message, session_id, key):
+        messages = await asyncio.to_thread(self._messages, user_message, session_id)
+        async with self.bulkhead.slot() if self.bulkhead else nullcontext():
+            if self.breaker:
+                self.breaker.allow()
+            start = time.perf_counter()
+            try:
+                response = await self._create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=CHAT_MAX_TOKENS,
+                    temperature=CHAT_TEMPERATURE
+                )
+            except Exception as e:
+                self.errors += 1
+                self._record(e)
+                raise
+            except BaseException:
+                # Cancelled before any response; a half-open probe must not stay taken
+                self._release()
+                raise
+            self._record()
+        latency = time.perf_counter() - start
+        self.latency.observe(latency)
+        answer = response.choices[0].message.content.strip()
+        if key is not None:
+            await asyncio.to_thread(self._store_response, key, user_message, answer, response.usage, latency)
+        return answer
+
+    async def stream(self, user_message, session_id=None):
+        """Yield answer tokens as the API produces them; aclose() cancels the upstream request."""
+        self.streams += 1
+        answer, key = await asyncio.to_thread(self._local_answer, user_message, session_id)
+        if answer is not None:
+            yield answer
+            await asyncio.to_thread(self._remember, session_id, user_message, answer)
+            return
+        if key is not None and self.coalescer is not None:
+            tokens = self.coalescer.stream(key, lambda: self._upstream_tokens(user_message, session_id, key))
+        else:
+            tokens = self._upstream_tokens(user_message, session_id, key)
+        received = []
+        try:
+            async for token in tokens:
+                received.append(token)
+                yield token
+        finally:
+            await tokens.aclose()
+        await asyncio.to_thread(self._remember, session_id, user_message, ''.join(received).strip())
+
+    async def _upstream_tokens(self, user_message, session_id, key):
+        messages = await asyncio.to_thread(self._messages, user_message, session_id)
+        async with self.bulkhead.slot() if self.bulkhead else nullcontext():
+            tokens = self._stream_upstream(messages, user_message, key)
+            try:
+                async for token in tokens:
+                    yield token
+            finally:
+                await tokens.aclose()
+
+    async def _stream_upstream(self, messages, user_message, key):
+        if self.breaker:
+            self.breaker.allow()
+        start = time.perf_counter()
+        try:
+            upstream = await self._create(
+                model=self.model,
+                messages=messages,
+                max_tokens=CHAT_MAX_TOKENS,
+                temperature=CHAT_TEMPERATURE,
+                stream=True
+            )
+        except Exception as e:
+            self.errors += 1
+            self._record(e)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        first = True
+        finished = False
+        tokens = []
+        try:
+            async for chunk in upstream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if not token:
+                    continue
+                if first:
+                    self.time_to_first_token.observe(time.perf_counter() - start)
+                    first = False
+                tokens.append(token)
+                yield token
+            finished = True
+            self._record()
+        except (GeneratorExit, asyncio.CancelledError):
+            # The client left; the API itself was fine
+            self.cancelled_streams += 1
+            self._record()
+            raise
+        except Exception as e:
+            self.errors += 1
+            self._record(e)
+            raise
+        finally:
+            if not finished:
+                await upstream.response.aclose()
+        latency = time.perf_counter() - start
+        self.latency.observe(latency)
+        if key is not None:
+            answer = ''.join(tokens).strip()
+            await asyncio.to_thread(self._store_response, key, user_message, answer, None, latency)
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpen(Exception):
+    pass
+
+class CircuitBreaker:
+    """Error-rate circuit breaker for calls to one dependency.
+
+    Closed: calls pass and outcomes are kept for the last `window` seconds. Once
+    at least `min_calls` are recorded and the failure share reaches
+    `failure_threshold`, the circuit opens and allow() raises CircuitOpen without
+    calling out. After `reset_timeout` seconds it goes half-open and lets
+    `half_open_probes` trial calls through: a success closes it, a failure
+    re-opens it. Every call that allow() admits must report back via record(),
+    or via release() if it was abandoned before there was an outcome.
+    """
+
+    def __init__(self, failure_threshold=0.5, min_calls=10, window=30.0, reset_timeout=30.0, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._failures = 0
+        self._probes = 0
+        self.state = CLOSED
+        self._changed_at = time.monotonic()
+        self.transitions = {}
+        self.rejected = 0
+
+    def _transition(self, state, now):
+        key = f'{self.state}_to_{state}'
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.state = state
+        self._changed_at = now
+        self._outcomes.clear()
+        self._failures = 0
+        self._probes = 0
+
+    def _prune(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def allow(self):
+        """Admit a call or raise CircuitOpen."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._changed_at >= self.reset_timeout:
+                self._transition(HALF_OPEN, now)
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            self.rejected += 1
+        raise CircuitOpen()
+
+    def record(self, success):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED if success else OPEN, now)
+                return
+            if self.state == OPEN:
+                # A call admitted before the circuit opened finished late
+                return
+            self._outcomes.append((now, not success))
+            self._failures += not success
+            self._prune(now)
+            if len(self._outcomes) >= self.min_calls and \
+                    self._failures / len(self._outcomes) >= self.failure_threshold:
+                self._transition(OPEN, now)
+
+    def release(self):
+        """Hand back an admitted call that ended with no outcome, e.g. cancelled before any response."""
+        with self._lock:
+            # Lets another trial call through instead of leaving the circuit half-open for good
+            if self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._outcomes)
+            return {
+                'state': self.state,
+                'seconds_in_state': time.monotonic() - self._changed_at,
+                'calls_in_window': calls,
+                'failure_rate': self._failures / calls if calls else 0.0,
+                'failure_threshold': self.failure_threshold,
+                'rejected': self.rejected,
+                'transitions': dict(self.transitions),
+            }
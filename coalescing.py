@@ -0,0 +1,278 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+class _StreamFlight:
+    """Tokens of one in-flight stream, replayable by requests that join late."""
+
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.cond = threading.Condition()
+
+    def publish(self, token):
+        with self.cond:
+            self.tokens.append(token)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def replay(self):
+        position = 0
+        while True:
+            with self.cond:
+                while position == len(self.tokens) and not self.done:
+                    self.cond.wait()
+                tokens = self.tokens[position:]
+                position = len(self.tokens)
+                done, error = self.done, self.error
+            yield from tokens
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+class SingleFlight:
+    """Collapses concurrent identical requests into one upstream call.
+
+    The first caller for a key (the leader) makes the call; callers arriving
+    while it is in flight wait for and share its result or exception. Streams
+    fan out: followers replay the tokens received so far and then get new ones
+    as the leader receives them. If the leader's own client disconnects while
+    followers are attached, it keeps draining the upstream stream for them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.stream_leaders = 0
+        self.stream_coalesced = 0
+        self.drained_for_followers = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stream(self, key, open_stream):
+        """Yield the tokens of open_stream(), called at most once per key among concurrent callers."""
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _StreamFlight()
+                self.stream_leaders += 1
+            else:
+                flight.followers += 1
+                self.stream_coalesced += 1
+        if leader:
+            yield from self._lead(key, flight, open_stream)
+            return
+        try:
+            yield from flight.replay()
+        finally:
+            with self._lock:
+                flight.followers -= 1
+
+    def _lead(self, key, flight, open_stream):
+        tokens = None
+        try:
+            tokens = open_stream()
+            for token in tokens:
+                flight.publish(token)
+                yield token
+            flight.finish()
+        except GeneratorExit:
+            with self._lock:
+                # Nobody else can join once the key is gone
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+                drain = flight.followers > 0
+            if drain:
+                self.drained_for_followers += 1
+                try:
+                    for token in tokens:
+                        flight.publish(token)
+                    flight.finish()
+                except Exception as e:
+                    flight.finish(e)
+            else:
+                flight.finish(GeneratorExit())
+            raise
+        except BaseException as e:
+            flight.finish(e)
+            raise
+        finally:
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            if tokens is not None:
+                tokens.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls) + len(self._streams),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'stream_leaders': self.stream_leaders,
+                'stream_coalesced': self.stream_coalesced,
+                'drained_for_followers': self.drained_for_followers,
+            }
+
+class _AsyncFlight:
+    """One shared upstream call on the event loop and the number of callers awaiting it."""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+class _AsyncStreamFlight:
+    """Tokens of one shared stream, pumped by its own task and replayed to every caller."""
+
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._wake = asyncio.Event()
+
+    def _notify(self):
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    async def pump(self, tokens):
+        try:
+            async for token in tokens:
+                self.tokens.append(token)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+            raise
+        finally:
+            await tokens.aclose()
+            self.done = True
+            self._notify()
+
+    async def replay(self):
+        position = 0
+        while True:
+            # Taken together, with no await in between, so no token can slip past
+            wake = self._wake
+            tokens = self.tokens[position:]
+            position = len(self.tokens)
+            done, error = self.done, self.error
+            for token in tokens:
+                yield token
+            if done:
+                if error is not None:
+                    raise error
+                return
+            await wake.wait()
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop.
+
+    The shared call runs as its own task, so a caller that goes away (its
+    task cancelled) doesn't cancel it for the others; it is cancelled only
+    once every caller has left. Streams are pumped by a task into a token
+    list that each caller replays from the start.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.stream_leaders = 0
+        self.stream_coalesced = 0
+        self.abandoned = 0
+
+    def _forget(self, flights, key, flight):
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def _finished(self, flights, key, flight, task):
+        self._forget(flights, key, flight)
+        # Every caller may have left already; fetch the error so it isn't logged as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, fn):
+        """Return the result of fn(), a coroutine function, awaited at most once per key at a time."""
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = self._calls[key] = _AsyncFlight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda task: self._finished(self._calls, key, flight, task))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Every caller left; nobody is waiting for the answer
+                self._forget(self._calls, key, flight)
+                flight.task.cancel()
+                self.abandoned += 1
+
+    async def stream(self, key, open_stream):
+        """Yield the tokens of open_stream(), an async iterator opened at most once per key at a time."""
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _AsyncStreamFlight()
+            flight.task = asyncio.ensure_future(flight.pump(open_stream()))
+            flight.task.add_done_callback(lambda task: self._finished(self._streams, key, flight, task))
+            self.stream_leaders += 1
+        else:
+            self.stream_coalesced += 1
+        flight.subscribers += 1
+        try:
+            async for token in flight.replay():
+                yield token
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.task.done():
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+                self.abandoned += 1
+
+    def stats(self):
+        return {
+            'in_flight': len(self._calls) + len(self._streams),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'stream_leaders': self.stream_leaders,
+            'stream_coalesced': self.stream_coalesced,
+            'abandoned': self.abandoned,
+        }
@@ -0,0 +1,198 @@
+"""Compact float32/int8 export of the maternal risk forest, with loader and evaluator.
+
+All trees are flattened into shared arrays: float32 thresholds over
+standardized features, int8 feature indices, the narrowest integer type that
+fits for child pointers, and uint8 quantized high-risk probabilities at the
+leaves. The scaler's mean and scale are stored alongside, and inputs are
+standardized and cast to float32 exactly as scikit-learn does before its trees
+compare them, so every row takes the same path as in the pickled forest; only
+the leaf quantization (at most 0.5/255 in probability) differs.
+
+Export, validate and compare against the pickled model:
+    python compact_model.py
+"""
+import argparse
+import os
+import pickle
+import time
+import numpy as np
+
+from model_utils import MODEL_DIR, SCALER_PATH, MODEL_PATH, get_current_models, predict_risk, synthetic_vitals
+
+COMPACT_MODEL_PATH = os.path.join(MODEL_DIR, 'maternal_risk_model.npz')
+PROBABILITY_LEVELS = 255
+# Largest probability change from rounding leaf values to 1/255 steps
+LEAF_QUANTIZATION_ERROR = 0.5 / PROBABILITY_LEVELS + 1e-9
+
+def _index_dtype(n_nodes):
+    return np.int16 if n_nodes <= np.iinfo(np.int16).max else np.int32
+
+def flatten_forest(model, scaler):
+    """Flatten a fitted forest into shared node arrays over standardized features.
+
+    Thresholds stay float64 as the trees store them, and standardize() gives
+    the float32 inputs the trees compare against them. Every node gets its
+    high-risk probability in 'value'; leaves point at themselves so traversal
+    can run a fixed max_depth steps.
+    """
+    positive = list(model.classes_).index(1)
+    lefts, rights, parents, features, thresholds, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(tree.node_count) + offset
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        parent = np.full(tree.node_count, -1)
+        parent[tree.children_left[~is_leaf]] = np.flatnonzero(~is_leaf)
+        parent[tree.children_right[~is_leaf]] = np.flatnonzero(~is_leaf)
+        parents.append(np.where(parent >= 0, parent + offset, -1))
+        feature = np.where(is_leaf, 0, tree.feature)
+        features.append(feature)
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        value = tree.value[:, 0, :]
+        values.append(value[:, positive] / value.sum(axis=1))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    return {
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'parent': np.concatenate(parents),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'value': np.concatenate(values),
+        'roots': np.array(roots),
+        'max_depth': max_depth,
+        'mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scale': np.asarray(scaler.scale_, dtype=np.float64),
+    }
+
+def standardize(rows, mean, scale):
+    """Scale raw vitals the way StandardScaler does, then cast to float32 as the trees do."""
+    X = np.array(rows, dtype=np.float64).reshape(-1, len(mean))
+    X -= mean
+    X /= scale
+    return X.astype(np.float32)
+
+def _float32_floor(thresholds):
+    """Largest float32 <= each threshold, so x <= t gives the same answer for any float32 x."""
+    rounded = thresholds.astype(np.float32)
+    return np.where(rounded > thresholds, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+def export_compact_model(model, scaler, path=COMPACT_MODEL_PATH, model_version=''):
+    """Write a fitted RandomForestClassifier and StandardScaler as a compact .npz file."""
+    forest = flatten_forest(model, scaler)
+    index_dtype = _index_dtype(len(forest['left']))
+    tmp_path = path + '.tmp.npz'
+    np.savez(
+        tmp_path,
+        left=forest['left'].astype(index_dtype),
+        right=forest['right'].astype(index_dtype),
+        feature=forest['feature'].astype(np.int8),
+        threshold=_float32_floor(forest['threshold']),
+        leaf_value=np.round(forest['value'] * PROBABILITY_LEVELS).astype(np.uint8),
+        roots=forest['roots'].astype(index_dtype),
+        max_depth=np.array(forest['max_depth'], dtype=np.int16),
+        mean=forest['mean'],
+        scale=forest['scale'],
+        model_version=np.array(model_version),
+    )
+    os.replace(tmp_path, path)
+    return path
+
+class CompactForest:
+    """Vectorized evaluator for the compact forest format; takes raw (unscaled) vitals."""
+
+    def __init__(self, arrays):
+        # Indices are stored narrow on disk but widened in memory; NumPy indexes fastest with intp
+        self.left = arrays['left'].astype(np.intp)
+        self.right = arrays['right'].astype(np.intp)
+        self.feature = arrays['feature'].astype(np.intp)
+        self.threshold = arrays['threshold']
+        self.leaf_value = arrays['leaf_value']
+        self.roots = arrays['roots'].astype(np.intp)
+        self.max_depth = int(arrays['max_depth'])
+        self.mean = arrays['mean']
+        self.scale = arrays['scale']
+        self.model_version = str(arrays['model_version'])
+
+    def predict_proba(self, rows):
+        """Probability of high risk per row, averaged over trees."""
+        X = standardize(rows, self.mean, self.scale)
+        flat = X.ravel()
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        # One (rows, trees) array of current nodes, advanced a level at a time
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = flat.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = np.where(go_left, self.left.take(nodes), self.right.take(nodes))
+        return self.leaf_value.take(nodes).mean(axis=1) / PROBABILITY_LEVELS
+
+    def predict(self, rows):
+        return (self.predict_proba(rows) > 0.5).astype(np.int64)
+
+def load_compact_model(path=COMPACT_MODEL_PATH):
+    try:
+        with np.load(path) as arrays:
+            return CompactForest({name: arrays[name] for name in arrays.files})
+    except FileNotFoundError:
+        return None
+
+def validate(compact, model, scaler, samples=20_000, tolerance=LEAF_QUANTIZATION_ERROR):
+    """Compare compact and original predictions on synthetic vitals."""
+    X, _ = synthetic_vitals(samples, seed=1)
+    expected_proba = model.predict_proba(scaler.transform(X))[:, list(model.classes_).index(1)]
+    compact_proba = compact.predict_proba(X)
+    agreement = float(np.mean(compact.predict(X) == predict_risk(model, scaler, X)))
+    max_error = float(np.max(np.abs(compact_proba - expected_proba)))
+    return {'agreement': agreement, 'max_probability_error': max_error, 'within_tolerance': max_error <= tolerance}
+
+def _time_per_call(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Export and validate the compact maternal risk model.')
+    parser.add_argument('--output', default=COMPACT_MODEL_PATH)
+    parser.add_argument('--tolerance', type=float, default=LEAF_QUANTIZATION_ERROR,
+                        help='max allowed probability difference')
+    args = parser.parse_args()
+
+    model, scaler, model_version = get_current_models()
+    if model is None:
+        raise SystemExit('No model in models/; run python train_model.py first.')
+    export_compact_model(model, scaler, args.output, model_version)
+
+    start = time.perf_counter()
+    with open(MODEL_PATH, 'rb') as f:
+        pickle.load(f)
+    with open(SCALER_PATH, 'rb') as f:
+        pickle.load(f)
+    pickle_load_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    compact = load_compact_model(args.output)
+    compact_load_ms = (time.perf_counter() - start) * 1000
+
+    report = validate(compact, model, scaler, tolerance=args.tolerance)
+    X, _ = synthetic_vitals(1000, seed=2)
+    row = X[:1]
+    print(f'{"":<22}{"pickle":>12}{"compact":>12}')
+    print(f'{"artifact bytes":<22}{os.path.getsize(MODEL_PATH) + os.path.getsize(SCALER_PATH):>12}'
+          f'{os.path.getsize(args.output):>12}')
+    print(f'{"load ms":<22}{pickle_load_ms:>12.2f}{compact_load_ms:>12.2f}')
+    print(f'{"single row ms":<22}{_time_per_call(lambda: predict_risk(model, scaler, row), 100):>12.3f}'
+          f'{_time_per_call(lambda: compact.predict(row), 100):>12.3f}')
+    print(f'{"batch of 1000 ms":<22}{_time_per_call(lambda: predict_risk(model, scaler, X), 10):>12.3f}'
+          f'{_time_per_call(lambda: compact.predict(X), 10):>12.3f}')
+    print(f'agreement {report["agreement"]:.4%}, max probability error {report["max_probability_error"]:.4f}')
+    if not report['within_tolerance']:
+        raise SystemExit(f'Compact model differs by more than {args.tolerance}; not valid for serving.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import threading
+import numpy as np
+
+from compact_model import flatten_forest, standardize
+from model_utils import FEATURE_NAMES
+
+class ContributionEngine:
+    """Per-feature contributions to the high-risk probability via tree-path deltas.
+
+    Each node stores the change in high-risk probability from its parent and the
+    parent's split feature, precomputed once per model. Explaining a row walks
+    the same paths as the forest (same standardized float32 inputs, same float64
+    thresholds) and sums the deltas it passes per feature, so bias +
+    sum(contributions) equals the forest's predicted probability up to float
+    rounding. The probability and label returned are taken from the leaves
+    reached, as the forest computes them.
+    """
+
+    def __init__(self, model, scaler, model_version=None):
+        forest = flatten_forest(model, scaler)
+        n_trees = len(forest['roots'])
+        parent = forest['parent']
+        has_parent = parent >= 0
+        value = forest['value']
+        self.model_version = model_version
+        self.left = forest['left'].astype(np.intp)
+        self.right = forest['right'].astype(np.intp)
+        self.feature = forest['feature'].astype(np.intp)
+        self.threshold = forest['threshold']
+        self.mean = forest['mean']
+        self.scale = forest['scale']
+        self.roots = forest['roots'].astype(np.intp)
+        self.max_depth = forest['max_depth']
+        self.value = value
+        # Averaged over trees up front so contributions just add up
+        self.delta = np.where(has_parent, value - value[np.maximum(parent, 0)], 0.0) / n_trees
+        self.delta_feature = np.where(has_parent, self.feature[np.maximum(parent, 0)], 0)
+        self.bias = float(value[self.roots].mean())
+
+    def explain(self, rows):
+        """Return (probabilities, contributions) for a batch; contributions has one column per feature."""
+        X = standardize(rows, self.mean, self.scale)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offsets = (np.arange(n_rows) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        totals = np.zeros(n_rows * n_features)
+        for _ in range(self.max_depth):
+            go_left = flat.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            next_nodes = np.where(go_left, self.left.take(nodes), self.right.take(nodes))
+            moved = next_nodes != nodes
+            if not moved.any():
+                break
+            stepped = next_nodes[moved]
+            slots = (row_offsets + self.delta_feature.take(next_nodes))[moved]
+            totals += np.bincount(slots, weights=self.delta.take(stepped), minlength=len(totals))
+            nodes = next_nodes
+        contributions = totals.reshape(n_rows, n_features)
+        return self.value.take(nodes).sum(axis=1) / len(self.roots), contributions
+
+    def explain_one(self, features):
+        """Explain one row as {'prediction', 'probability', 'bias', 'contributions': {feature: value}}."""
+        probabilities, contributions = self.explain([features])
+        return {
+            # Ties go to low risk, as in the forest's predict
+            'prediction': int(probabilities[0] > 0.5),
+            'probability': float(probabilities[0]),
+            'bias': self.bias,
+            'contributions': {name: float(c) for name, c in zip(FEATURE_NAMES, contributions[0])},
+        }
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_contribution_engine(model, scaler, model_version):
+    """Return the engine for model_version, building it once when the model changes."""
+    global _engine
+    engine = _engine
+    if engine is None or engine.model_version != model_version:
+        with _engine_lock:
+            if _engine is None or _engine.model_version != model_version:
+                _engine = ContributionEngine(model, scaler, model_version)
+            engine = _engine
+    return engine
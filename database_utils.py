@@ -1,8 +1,19 @@
 import sqlite3
 import os
+import struct
+import numpy as np
 
 DATABASE_PATH = 'doctors.db'
 
+# Vitals are stored packed as five little-endian float32: age, bmi, bp, hb, sugar
+VITALS_FORMAT = struct.Struct('<5f')
+# Stay well under SQLite's bound-parameter limit
+MAX_QUERY_PARAMS = 500
+
+def index_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
 def init_db():
     """Initialize the database and create the doctors, patients, and appointments tables if they don't exist."""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -30,10 +41,22 @@ def init_db():
             risk_level TEXT NOT NULL,    -- 'Low Risk', 'Moderate Risk', 'High Risk'
             doctor_id INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            age REAL,                    -- latest stored vitals, used for re-scoring
+            bmi REAL,
+            bp REAL,
+            hb REAL,
+            sugar REAL,
             FOREIGN KEY (doctor_id) REFERENCES doctors (id)
         )
     ''')
 
+    # Add vitals columns to patients tables created before they existed
+    cursor.execute('PRAGMA table_info(patients)')
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    for column in ('age', 'bmi', 'bp', 'hb', 'sugar'):
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE patients ADD COLUMN {column} REAL')
+
     # Create appointments table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS appointments (
@@ -62,6 +85,59 @@ def init_db():
         )
     ''')
 
+    # Create vitals table (time series of readings per patient)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vitals (
+            id INTEGER PRIMARY KEY,
+            patient_id INTEGER NOT NULL,
+            measured_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            features BLOB NOT NULL,      -- VITALS_FORMAT packed age, bmi, bp, hb, sugar
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )
+    ''')
+    # One reading per patient and time, so readings a device resends are stored once;
+    # it also serves the latest-reading lookups the old covering index was for
+    if not index_exists(cursor, 'idx_vitals_reading'):
+        cursor.execute('''
+            DELETE FROM vitals WHERE id NOT IN (
+                SELECT MIN(id) FROM vitals GROUP BY patient_id, measured_at
+            )
+        ''')
+        cursor.execute('CREATE UNIQUE INDEX idx_vitals_reading ON vitals (patient_id, measured_at)')
+        cursor.execute('DROP INDEX IF EXISTS idx_vitals_patient_measured')
+
+    # Create alerts table (trend alerts raised from vitals streams)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY,
+            patient_id INTEGER NOT NULL,
+            rule TEXT NOT NULL,
+            value REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            resolved_at TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients (id)
+        )
+    ''')
+    # The dashboard only lists open alerts, newest first
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_open
+        ON alerts (created_at DESC) WHERE resolved_at IS NULL
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_patient ON alerts (patient_id, rule)')
+    # At most one open alert per patient and rule, even with several app workers raising them;
+    # duplicates opened before this index existed are resolved, keeping the oldest
+    if not index_exists(cursor, 'idx_alerts_open_rule'):
+        cursor.execute('''
+            UPDATE alerts SET resolved_at = CURRENT_TIMESTAMP
+            WHERE resolved_at IS NULL AND id NOT IN (
+                SELECT MIN(id) FROM alerts WHERE resolved_at IS NULL GROUP BY patient_id, rule
+            )
+        ''')
+        cursor.execute('''
+            CREATE UNIQUE INDEX idx_alerts_open_rule
+            ON alerts (patient_id, rule) WHERE resolved_at IS NULL
+        ''')
+
     # Check if doctors data already exists
     cursor.execute('SELECT COUNT(*) FROM doctors')
     count = cursor.fetchone()[0]
@@ -297,6 +373,190 @@ def add_patient(first_name, last_name, patient_type, risk_level, doctor_id=None)
     conn.close()
     return patient_id
 
+def add_vitals_batch(readings):
+    """Insert vitals readings in one transaction.
+
+    readings is a list of (patient_id, measured_at, age, bmi, bp, hb, sugar); a
+    measured_at of None means now. A reading for a patient and time already
+    stored (or earlier in the batch) is a resend and is ignored. Each patient's
+    stored latest vitals are updated from their newest reading in the batch,
+    unless a reading at least as new is already stored.
+    """
+    if not readings:
+        return 0
+    rows = [(r[0], r[1], VITALS_FORMAT.pack(*r[2:7])) for r in readings]
+    latest = {}
+    for r in readings:
+        # None (now) sorts after any explicit timestamp; of equal times the first is kept
+        if r[0] not in latest or (r[1] or '~') > (latest[r[0]][1] or '~'):
+            latest[r[0]] = r
+    conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+    cursor = conn.cursor()
+    stored = {}
+    patient_ids = list(latest)
+    for start in range(0, len(patient_ids), MAX_QUERY_PARAMS):
+        chunk = patient_ids[start:start + MAX_QUERY_PARAMS]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f'''
+            SELECT patient_id, MAX(measured_at) FROM vitals
+            WHERE patient_id IN ({placeholders})
+            GROUP BY patient_id
+        ''', chunk)
+        stored.update(cursor.fetchall())
+    cursor.executemany('''
+        INSERT OR IGNORE INTO vitals (patient_id, measured_at, features)
+        VALUES (?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+    ''', rows)
+    cursor.executemany('''
+        UPDATE patients SET age = ?, bmi = ?, bp = ?, hb = ?, sugar = ?
+        WHERE id = ?
+    ''', [(*r[2:7], r[0]) for r in latest.values()
+          if r[1] is None or stored.get(r[0]) is None or r[1] > stored[r[0]]])
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+def get_existing_patient_ids(patient_ids):
+    """Return the subset of patient_ids that exist."""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    existing = set()
+    patient_ids = list(patient_ids)
+    for start in range(0, len(patient_ids), MAX_QUERY_PARAMS):
+        chunk = patient_ids[start:start + MAX_QUERY_PARAMS]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f'SELECT id FROM patients WHERE id IN ({placeholders})', chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    conn.close()
+    return existing
+
+def get_recent_vitals_all(per_patient=5):
+    """Get up to per_patient most recent readings for every patient, oldest first per patient.
+
+    Returns (patient_ids, measured_at, matrix) with one entry per reading.
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT patient_id, measured_at, features FROM (
+            SELECT patient_id, measured_at, features,
+                   ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY measured_at DESC) AS recency
+            FROM vitals
+        )
+        WHERE recency <= ?
+        ORDER BY patient_id, measured_at
+    ''', (per_patient,))
+    rows = cursor.fetchall()
+    conn.close()
+    matrix = np.frombuffer(b''.join(row[2] for row in rows), dtype='<f4').reshape(-1, 5)
+    return np.array([row[0] for row in rows], dtype=np.int64), [row[1] for row in rows], matrix
+
+def add_alerts(alerts):
+    """Open alerts; alerts is a list of (patient_id, rule, value). Alerts already open are kept."""
+    conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+    cursor = conn.cursor()
+    cursor.executemany('INSERT OR IGNORE INTO alerts (patient_id, rule, value) VALUES (?, ?, ?)', alerts)
+    conn.commit()
+    conn.close()
+
+def resolve_alerts(alerts):
+    """Close open alerts; alerts is a list of (patient_id, rule)."""
+    conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+    cursor = conn.cursor()
+    cursor.executemany('''
+        UPDATE alerts SET resolved_at = CURRENT_TIMESTAMP
+        WHERE patient_id = ? AND rule = ? AND resolved_at IS NULL
+    ''', alerts)
+    conn.commit()
+    conn.close()
+
+def get_open_alert_keys():
+    """Get (patient_id, rule) for every open alert."""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT DISTINCT patient_id, rule FROM alerts WHERE resolved_at IS NULL')
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_open_alerts(limit=20):
+    """Get the newest open trend alerts."""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT a.id, a.patient_id, p.first_name, p.last_name, a.rule, a.value, a.created_at
+        FROM alerts a
+        LEFT JOIN patients p ON a.patient_id = p.id
+        WHERE a.resolved_at IS NULL
+        ORDER BY a.created_at DESC
+        LIMIT ?
+    ''', (limit,))
+    rows = cursor.fetchall()
+    conn.close()
+
+    alerts = []
+    for row in rows:
+        alerts.append({
+            'id': row[0],
+            'patient_id': row[1],
+            'patient_name': f'{row[2]} {row[3]}' if row[2] else 'Unknown',
+            'rule': row[4],
+            'value': row[5],
+            'created_at': row[6]
+        })
+    return alerts
+
+def get_patient_vitals_chunk(after_id=0, limit=1000):
+    """Get mothers with stored vitals in id order, starting after after_id (keyset pagination)."""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, age, bmi, bp, hb, sugar, risk_level
+        FROM patients
+        WHERE id > ? AND patient_type = 'Mother'
+          AND age IS NOT NULL AND bmi IS NOT NULL AND bp IS NOT NULL
+          AND hb IS NOT NULL AND sugar IS NOT NULL
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, limit))
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def get_mother_vitals(patient_ids):
+    """Get the mothers among patient_ids that have stored vitals.
+
+    Rows are (id, age, bmi, bp, hb, sugar, risk_level) like
+    get_patient_vitals_chunk: the float64 patients columns that add_vitals_batch
+    keeps at each patient's latest reading, so the re-evaluator scores the same
+    values as rescore_patients and /maternal.
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    rows = []
+    patient_ids = list(patient_ids)
+    for start in range(0, len(patient_ids), MAX_QUERY_PARAMS):
+        chunk = patient_ids[start:start + MAX_QUERY_PARAMS]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f'''
+            SELECT id, age, bmi, bp, hb, sugar, risk_level
+            FROM patients
+            WHERE id IN ({placeholders}) AND patient_type = 'Mother'
+              AND age IS NOT NULL AND bmi IS NOT NULL AND bp IS NOT NULL
+              AND hb IS NOT NULL AND sugar IS NOT NULL
+        ''', chunk)
+        rows.extend(cursor.fetchall())
+    conn.close()
+    return rows
+
+def update_patient_risk_levels(updates):
+    """Update risk levels in a single transaction; updates is a list of (risk_level, patient_id)."""
+    conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+    cursor = conn.cursor()
+    cursor.executemany('UPDATE patients SET risk_level = ? WHERE id = ?', updates)
+    conn.commit()
+    conn.close()
+
 def add_appointment(patient_id, doctor_id, date, time, reason):
     """Add a new appointment."""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -0,0 +1,98 @@
+import math
+import os
+import threading
+import time
+import numpy as np
+
+from model_utils import FEATURE_NAMES, FEATURE_RANGES, SKETCH_BINS, load_training_sketch
+
+DRIFT_WINDOW = int(os.getenv('DRIFT_WINDOW', '5000'))
+DRIFT_CHECK_INTERVAL = float(os.getenv('DRIFT_CHECK_INTERVAL', '60'))
+# PSI rule of thumb: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant shift
+PSI_ALERT = 0.25
+_EPSILON = 1e-4
+
+def population_stability_index(expected, actual):
+    p = expected / max(expected.sum(), 1) + _EPSILON
+    q = actual / max(actual.sum(), 1) + _EPSILON
+    return float(np.sum((q - p) * np.log(q / p)))
+
+def ks_statistic(expected, actual):
+    """Largest gap between the two binned CDFs."""
+    p = np.cumsum(expected) / max(expected.sum(), 1)
+    q = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(p - q)))
+
+class DriftMonitor:
+    """Streaming per-feature histograms of served vitals compared against the training sketch.
+
+    Each observation costs one bin computation per feature. Memory is two fixed
+    histograms: the current window and the previous one, so scores reflect the
+    last DRIFT_WINDOW to 2 * DRIFT_WINDOW predictions rather than all time.
+    """
+
+    def __init__(self, window=DRIFT_WINDOW, check_interval=DRIFT_CHECK_INTERVAL):
+        self.window = window
+        self.check_interval = check_interval
+        shape = (len(FEATURE_NAMES), SKETCH_BINS + 2)
+        self._current = np.zeros(shape, dtype=np.int64)
+        self._previous = np.zeros(shape, dtype=np.int64)
+        self._in_window = 0
+        self._bounds = tuple((lo, (hi - lo) / SKETCH_BINS) for lo, hi in FEATURE_RANGES)
+        self._lock = threading.Lock()
+        self._training = None
+        self._training_version = None
+        self._scores = None
+        self._checked_at = 0.0
+        self.observed = 0
+
+    def observe(self, features):
+        with self._lock:
+            for i, (value, (lo, width)) in enumerate(zip(features, self._bounds)):
+                index = min(max(math.floor((value - lo) / width) + 1, 0), SKETCH_BINS + 1)
+                self._current[i, index] += 1
+            self.observed += 1
+            self._in_window += 1
+            if self._in_window >= self.window:
+                self._previous, self._current = self._current, self._previous
+                self._current[:] = 0
+                self._in_window = 0
+
+    def _training_sketch(self, model_version):
+        if self._training is None or self._training_version != model_version:
+            self._training = load_training_sketch()
+            self._training_version = model_version
+        return self._training
+
+    def scores(self, model_version=None):
+        """PSI and KS per feature, recomputed at most every check_interval seconds."""
+        now = time.monotonic()
+        if self._scores is not None and now - self._checked_at < self.check_interval \
+                and self._training_version == model_version:
+            return self._scores
+        training = self._training_sketch(model_version)
+        with self._lock:
+            serving = self._current + self._previous
+        if training is None or not serving.sum():
+            return None
+        scores = {}
+        for i, name in enumerate(FEATURE_NAMES):
+            psi = population_stability_index(training[i], serving[i])
+            scores[name] = {
+                'psi': psi,
+                'ks': ks_statistic(training[i], serving[i]),
+                'drifted': psi > PSI_ALERT,
+            }
+        self._scores = scores
+        self._checked_at = now
+        return scores
+
+    def stats(self, model_version=None):
+        scores = self.scores(model_version)
+        return {
+            'observed': self.observed,
+            'window': self.window,
+            'training_sketch_loaded': self._training is not None,
+            'features': scores,
+            'drifted_features': [name for name, s in (scores or {}).items() if s['drifted']],
+        }
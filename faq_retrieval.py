@@ -0,0 +1,190 @@
+"""BM25 retrieval over the curated maternal and child care FAQ.
+
+Compile the index ahead of time (otherwise it is built at startup):
+    python faq_retrieval.py
+    python faq_retrieval.py --query "what should I eat while pregnant"
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import numpy as np
+
+from metrics_utils import LatencyHistogram
+from model_utils import MODEL_DIR, atomic_write
+
+FAQ_PATH = os.getenv('FAQ_PATH', os.path.join('data', 'maternal_faq.json'))
+FAQ_INDEX_PATH = os.getenv('FAQ_INDEX_PATH', os.path.join(MODEL_DIR, 'faq_index.json'))
+# An FAQ answer is served only when the best match clears both thresholds; coverage is the
+# share of the query's content words the entry contains, so 1.0 means every one of them
+FAQ_MIN_SCORE = float(os.getenv('FAQ_MIN_SCORE', '3.0'))
+FAQ_MIN_COVERAGE = float(os.getenv('FAQ_MIN_COVERAGE', '1.0'))
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset('''
+a about after am an and any are as at be been before but by can could did do does doing for from
+had has have he her him his how i if im in into is it its me my of on or our she should so that the their them then
+there these they this to up was we were what when where which while who why will with would you your
+'''.split())
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def _stem(word):
+    # Just enough suffix folding for plurals and -ing forms to match
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 5 and word.endswith('ing'):
+        return word[:-3]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+def compile_index(entries, source_hash=None):
+    """Build the JSON-serializable inverted index: term -> [[doc ids], [term frequencies]]."""
+    postings = {}
+    doc_lengths = []
+    for doc, entry in enumerate(entries):
+        terms = tokenize(' '.join([entry['question']] + entry.get('keywords', [])))
+        doc_lengths.append(len(terms))
+        for term in set(terms):
+            docs, frequencies = postings.setdefault(term, ([], []))
+            docs.append(doc)
+            frequencies.append(terms.count(term))
+    return {
+        'source_hash': source_hash,
+        'entries': [{'id': e['id'], 'question': e['question'], 'answer': e['answer']} for e in entries],
+        'doc_lengths': doc_lengths,
+        'postings': postings,
+    }
+
+class FaqIndex:
+    """Inverted index with BM25 weights precomputed per posting.
+
+    Scoring a query is one array scatter-add per query term. Confidence is the
+    share of query terms the best entry's question and keywords contain. A
+    common word like "pregnancy" must count as much as any other: "yellow eyes
+    in pregnancy" is not the newborn jaundice question, so by default any word
+    the entry doesn't mention sends the question to the model.
+    """
+
+    def __init__(self, compiled, min_score=FAQ_MIN_SCORE, min_coverage=FAQ_MIN_COVERAGE):
+        self.entries = compiled['entries']
+        self.source_hash = compiled.get('source_hash')
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        doc_lengths = np.asarray(compiled['doc_lengths'], dtype=np.float64)
+        n_docs = len(doc_lengths)
+        length_norm = 1 - BM25_B + BM25_B * doc_lengths / max(doc_lengths.mean(), 1.0)
+        self._postings = {}
+        for term, (docs, frequencies) in compiled['postings'].items():
+            docs = np.asarray(docs, dtype=np.intp)
+            tf = np.asarray(frequencies, dtype=np.float64)
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            self._postings[term] = (docs, idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm[docs]))
+        self._by_terms = {}
+        for entry in self.entries:
+            self._by_terms.setdefault(frozenset(tokenize(entry['question'])), entry)
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.deflected = 0
+
+    def search(self, query, k=3):
+        """Return up to k (entry, score, coverage) matches, best first."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scores = np.zeros(len(self.entries))
+        matched = np.zeros(len(self.entries))
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                docs, weights = posting
+                scores[docs] += weights
+                matched[docs] += 1
+        best = np.argsort(-scores)[:k]
+        return [(self.entries[i], float(scores[i]), float(matched[i] / len(terms))) for i in best if scores[i] > 0]
+
+    def exact_match(self, query):
+        """Return the entry whose question has exactly the query's content words, or None."""
+        terms = frozenset(tokenize(query))
+        return self._by_terms.get(terms) if terms else None
+
+    def answer(self, query):
+        """Return the best entry if it is a confident match, else None."""
+        start = time.perf_counter()
+        matches = self.search(query, k=1)
+        match = None
+        if matches:
+            entry, score, coverage = matches[0]
+            if score >= self.min_score and coverage >= self.min_coverage:
+                match = entry
+        self.latency.observe(time.perf_counter() - start)
+        with self._lock:
+            self.lookups += 1
+            if match is not None:
+                self.deflected += 1
+        return match
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'terms': len(self._postings),
+                'min_score': self.min_score,
+                'min_coverage': self.min_coverage,
+                'lookups': self.lookups,
+                'deflected': self.deflected,
+                'deflection_rate': self.deflected / self.lookups if self.lookups else 0.0,
+                'latency': self.latency.stats(),
+            }
+
+def _read_faq(faq_path):
+    with open(faq_path, 'rb') as f:
+        raw = f.read()
+    return json.loads(raw), hashlib.sha256(raw).hexdigest()
+
+def load_faq_index(faq_path=FAQ_PATH, index_path=FAQ_INDEX_PATH):
+    """Load the precompiled index if it matches the FAQ file, otherwise build it; None without an FAQ."""
+    try:
+        entries, source_hash = _read_faq(faq_path)
+    except FileNotFoundError:
+        return None
+    try:
+        with open(index_path) as f:
+            compiled = json.load(f)
+        if compiled.get('source_hash') == source_hash:
+            return FaqIndex(compiled)
+    except (FileNotFoundError, ValueError):
+        pass
+    return FaqIndex(compile_index(entries, source_hash))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--faq', default=FAQ_PATH)
+    parser.add_argument('--output', default=FAQ_INDEX_PATH)
+    parser.add_argument('--query', help='show the top matches for a question instead of compiling')
+    args = parser.parse_args()
+
+    entries, source_hash = _read_faq(args.faq)
+    compiled = compile_index(entries, source_hash)
+    if args.query:
+        index = FaqIndex(compiled)
+        for entry, score, coverage in index.search(args.query):
+            print(f'{score:6.2f}  coverage {coverage:.2f}  {entry["question"]}')
+        print('answered from FAQ' if index.answer(args.query) else 'falls back to the model')
+        return
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    atomic_write(args.output, json.dumps(compiled).encode())
+    print(f'Indexed {len(entries)} FAQ entries ({len(compiled["postings"])} terms) into {args.output}')
+
+if __name__ == '__main__':
+    main()
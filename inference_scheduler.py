@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+BATCH_WINDOW = float(os.getenv('INFERENCE_BATCH_WINDOW_MS', '2')) / 1000
+MAX_BATCH_SIZE = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '64'))
+PREDICT_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT_MS', '250')) / 1000
+
+class InferenceScheduler:
+    """Micro-batches concurrent single-row predictions into one batched call.
+
+    predict_fn takes a list of feature rows and returns one prediction per row.
+    Requests are collected for up to `window` seconds or `max_batch_size` rows;
+    callers that time out, or find the queue full, predict directly instead.
+    """
+
+    def __init__(self, predict_fn, window=BATCH_WINDOW, max_batch_size=MAX_BATCH_SIZE,
+                 timeout=PREDICT_TIMEOUT, max_queue=None):
+        self.predict_fn = predict_fn
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue or max_batch_size * 16)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.batched_requests = 0
+        self.largest_batch = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        # Started lazily so forked web workers each get their own thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+                    self._thread.start()
+
+    def submit(self, features):
+        """Queue one feature row and return a Future for its prediction."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put_nowait((features, future))
+        return future
+
+    def predict(self, features, timeout=None):
+        """Predict one row through the batcher, falling back to a direct call."""
+        try:
+            future = self.submit(features)
+        except queue.Full:
+            return self._predict_direct(features)
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            future.cancel()
+        except Exception:
+            pass
+        return self._predict_direct(features)
+
+    def _predict_direct(self, features):
+        with self._stats_lock:
+            self.fallbacks += 1
+        return self.predict_fn([features])[0]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # Drop requests whose callers already gave up and went direct
+        batch = [(features, future) for features, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            predictions = self.predict_fn([features for features, _ in batch])
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), prediction in zip(batch, predictions):
+            future.set_result(prediction)
+        with self._stats_lock:
+            self.batches += 1
+            self.batched_requests += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch_size': self.max_batch_size,
+                'queue_depth': self._queue.qsize(),
+                'batches': self.batches,
+                'batched_requests': self.batched_requests,
+                'mean_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'timeouts': self.timeouts,
+                'fallbacks': self.fallbacks,
+                'errors': self.errors,
+            }
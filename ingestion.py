@@ -0,0 +1,195 @@
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from model_utils import FEATURE_NAMES
+
+INGEST_CHUNK_LINES = int(os.getenv('INGEST_CHUNK_LINES', '500'))
+INGEST_MAX_PENDING_BATCHES = int(os.getenv('INGEST_MAX_PENDING_BATCHES', '32'))
+# Queued batches are merged into one transaction up to this many readings
+INGEST_MAX_ROWS_PER_TRANSACTION = 5000
+
+# Accepted ranges per feature; readings outside them are rejected as device errors
+VITALS_LIMITS = {
+    'age': (10, 60),
+    'bmi': (10, 70),
+    'bp': (50, 260),
+    'hb': (3, 22),
+    'sugar': (20, 600),
+}
+
+class WriterSaturated(Exception):
+    pass
+
+def iter_line_chunks(stream, chunk_lines=INGEST_CHUNK_LINES):
+    """Yield chunks of (line number, line) pairs from a newline-delimited byte stream.
+
+    Lines are numbered as sent, blank ones included, and blank lines are then skipped.
+    """
+    lines = ((number, line) for number, line in enumerate(stream, 1) if line.strip())
+    while True:
+        chunk = list(itertools.islice(lines, chunk_lines))
+        if not chunk:
+            return
+        yield chunk
+
+def parse_measured_at(value):
+    """Parse an ISO 8601 timestamp into SQLite's UTC 'YYYY-MM-DD HH:MM:SS' form.
+
+    Timestamps without an offset are taken as UTC, like CURRENT_TIMESTAMP.
+    """
+    if not isinstance(value, str):
+        raise ValueError('measured_at must be an ISO 8601 string')
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('measured_at must be an ISO 8601 string') from None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.strftime('%Y-%m-%d %H:%M:%S')
+
+def parse_vitals_lines(numbered_lines, existing_patients=None):
+    """Validate NDJSON vitals readings given as (line number, line) pairs.
+
+    Returns (readings, errors): readings are (patient_id, measured_at, age, bmi,
+    bp, hb, sugar) tuples and errors are {'line', 'error'} dicts. If given,
+    existing_patients(ids) returns the subset of ids that exist, and readings
+    for any other patient are rejected.
+    """
+    parsed, errors = [], []
+    for line_number, line in numbered_lines:
+        try:
+            record = json.loads(line)
+            patient_id = int(record['patient_id'])
+            measured_at = record.get('measured_at')
+            if measured_at is not None:
+                measured_at = parse_measured_at(measured_at)
+            values = []
+            for name in FEATURE_NAMES:
+                value = float(record[name])
+                low, high = VITALS_LIMITS[name]
+                if not math.isfinite(value) or not low <= value <= high:
+                    raise ValueError(f'{name} out of range')
+                values.append(value)
+        except KeyError as e:
+            errors.append({'line': line_number, 'error': f'missing field {e.args[0]}'})
+            continue
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append({'line': line_number, 'error': str(e)})
+            continue
+        parsed.append((line_number, (patient_id, measured_at, *values)))
+
+    # SQLite doesn't enforce the foreign key, so unknown patients are checked here
+    known = existing_patients({reading[0] for _, reading in parsed}) if existing_patients and parsed else None
+    readings = []
+    for line_number, reading in parsed:
+        if known is not None and reading[0] not in known:
+            errors.append({'line': line_number, 'error': f'unknown patient_id {reading[0]}'})
+        else:
+            readings.append(reading)
+    errors.sort(key=lambda error: error['line'])
+    return readings, errors
+
+class VitalsWriter:
+    """Single writer thread for ingested vitals with a bounded queue of batches.
+
+    Batches waiting together are committed in one transaction (group commit).
+    submit() raises WriterSaturated instead of blocking when the queue is full,
+    which the endpoint turns into 429 + Retry-After.
+
+    write_fn(readings) commits the readings and returns what after_write needs.
+    Futures resolve as soon as the commit succeeds; after_write (risk and trend
+    updates) runs afterwards, so its failures are counted but never reported as
+    a failed write that devices would resend.
+    """
+
+    def __init__(self, write_fn, after_write=None, max_pending=INGEST_MAX_PENDING_BATCHES):
+        self.write_fn = write_fn
+        self.after_write = after_write
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.transactions = 0
+        self.rows = 0
+        self.saturated = 0
+        self.errors = 0
+        self.after_write_errors = 0
+        self.write_seconds = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='vitals-writer', daemon=True)
+                    self._thread.start()
+
+    def submit(self, readings):
+        """Queue a batch for writing; returns a Future resolving to the number of rows written."""
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((readings, future))
+        except queue.Full:
+            self.saturated += 1
+            raise WriterSaturated()
+        return future
+
+    def retry_after(self):
+        """Seconds a client should wait, estimated from the backlog and recent write speed."""
+        per_batch = self.write_seconds / self.transactions if self.transactions else 0.05
+        return max(1, math.ceil(self._queue.qsize() * per_batch))
+
+    def _run(self):
+        while True:
+            batches = [self._queue.get()]
+            rows = len(batches[0][0])
+            while rows < INGEST_MAX_ROWS_PER_TRANSACTION:
+                try:
+                    batch = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batches.append(batch)
+                rows += len(batch[0])
+            readings = [reading for batch_readings, _ in batches for reading in batch_readings]
+            start = time.perf_counter()
+            try:
+                written = self.write_fn(readings) if readings else None
+            except Exception as e:
+                print(f"Error writing ingested vitals: {e}")
+                self.errors += 1
+                for _, future in batches:
+                    future.set_exception(e)
+                continue
+            self.write_seconds += time.perf_counter() - start
+            self.transactions += 1
+            self.batches += len(batches)
+            self.rows += len(readings)
+            for batch_readings, future in batches:
+                future.set_result(len(batch_readings))
+            if self.after_write is None or not readings:
+                continue
+            try:
+                self.after_write(written)
+            except Exception as e:
+                print(f"Error updating risk and trends for ingested vitals: {e}")
+                self.after_write_errors += 1
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'batches': self.batches,
+            'transactions': self.transactions,
+            'rows': self.rows,
+            'saturated_rejections': self.saturated,
+            'errors': self.errors,
+            'after_write_errors': self.after_write_errors,
+            'rows_per_write_second': self.rows / self.write_seconds if self.write_seconds else 0.0,
+        }
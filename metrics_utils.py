@@ -0,0 +1,63 @@
+import bisect
+import threading
+
+# Bucket upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+class Histogram:
+    """Fixed-bucket histogram with O(1) updates and constant memory."""
+
+    def __init__(self, buckets, unit=''):
+        self.buckets = tuple(buckets)
+        self.unit = unit
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Upper bucket bound containing the q-th percentile (0-100)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q / 100 * self.count
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= target and count:
+                    return self.buckets[i] if i < len(self.buckets) else self.max
+            return self.max
+
+    def stats(self):
+        suffix = f'_{self.unit}' if self.unit else ''
+        result = {
+            'count': self.count,
+            f'mean{suffix}': self.total / self.count if self.count else 0.0,
+            f'max{suffix}': self.max,
+            f'p50{suffix}': self.percentile(50),
+            f'p95{suffix}': self.percentile(95),
+            f'p99{suffix}': self.percentile(99),
+        }
+        with self._lock:
+            labels = [f'le_{bound}' for bound in self.buckets] + ['le_inf']
+            result['buckets'] = dict(zip(labels, self.counts))
+        return result
+
+class LatencyHistogram(Histogram):
+    """Histogram of durations observed in seconds and reported in milliseconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        super().__init__(buckets, unit='ms')
+
+    def observe(self, seconds):
+        super().observe(seconds * 1000)
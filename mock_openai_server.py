@@ -0,0 +1,244 @@
+"""Local stand-in for the OpenAI chat.completions API, for benchmarks and offline testing.
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8001/v1 (any API key works):
+    python mock_openai_server.py --port 8001 --latency-ms 300 --token-delay-ms 20
+Latency before the first token can follow a distribution, and a share of requests can fail the
+way the real API does (500, 429 with Retry-After, or the connection dropping mid-response):
+    python mock_openai_server.py --latency-distribution lognormal --latency-jitter 0.5 \
+        --error-rate 0.02 --rate-limit-rate 0.05 --disconnect-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_ANSWER = ('During pregnancy, eat a balanced diet with plenty of fruit, vegetables, whole grains, '
+               'protein such as lentils, eggs and fish, and dairy for calcium. Take folic acid and iron '
+               'as advised, drink enough water, and avoid alcohol, raw meat and unpasteurised cheese. '
+               'Please check with your doctor or midwife about what is right for you.')
+
+LATENCY_DISTRIBUTIONS = ('constant', 'uniform', 'lognormal', 'exponential')
+OK, SERVER_ERROR, RATE_LIMITED, DISCONNECT = 'ok', 'server_error', 'rate_limited', 'disconnect'
+
+class MockStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'streams': 0, 'completed': 0, 'cancelled': 0,
+                       'server_errors': 0, 'rate_limited': 0, 'disconnects': 0}
+
+    def incr(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Set on the class by make_server
+    config = None
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_rate_limited(self):
+        body = json.dumps(api_error('Rate limit reached for requests.', 'rate_limit_error')).encode()
+        self.send_response(429)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Retry-After', str(self.config.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.stats.snapshot())
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+        self.stats.incr('requests')
+        tokens = self.config.tokens(payload)
+        outcome = self.config.outcome()
+        time.sleep(self.config.sample_latency())
+        if outcome == SERVER_ERROR:
+            self.stats.incr('server_errors')
+            self._send_json(500, api_error('The server had an error while processing your request.', 'server_error'))
+        elif outcome == RATE_LIMITED:
+            self.stats.incr('rate_limited')
+            self._send_rate_limited()
+        elif outcome == DISCONNECT and not payload.get('stream'):
+            # Drop the connection without answering
+            self.stats.incr('disconnects')
+            self.close_connection = True
+        elif payload.get('stream'):
+            self._stream(payload, tokens, drop=outcome == DISCONNECT)
+        else:
+            time.sleep(self.config.token_delay * len(tokens))
+            self._send_json(200, completion(payload, ''.join(tokens)))
+            self.stats.incr('completed')
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, payload, tokens, drop=False):
+        self.stats.incr('streams')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        try:
+            for i, token in enumerate(tokens):
+                if drop and i == len(tokens) // 2:
+                    # Cut the stream off halfway, without the terminating chunk
+                    self.stats.incr('disconnects')
+                    self.close_connection = True
+                    return
+                if i:
+                    time.sleep(self.config.token_delay)
+                chunk = completion_chunk(payload, completion_id, {'content': token}, None)
+                self._write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+            chunk = completion_chunk(payload, completion_id, {}, 'stop')
+            self._write_chunk(f'data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n'.encode())
+            self._write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-stream; stop generating like the real API does
+            self.stats.incr('cancelled')
+            self.close_connection = True
+            return
+        self.stats.incr('completed')
+
+def api_error(message, error_type):
+    return {'error': {'message': message, 'type': error_type, 'param': None, 'code': None}}
+
+def completion(payload, content):
+    prompt_tokens = sum(len(m.get('content', '')) // 4 for m in payload.get('messages', []))
+    completion_tokens = len(content) // 4
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex[:24]}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': payload.get('model', 'gpt-3.5-turbo'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                     'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+def completion_chunk(payload, completion_id, delta, finish_reason):
+    return {
+        'id': completion_id,
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': payload.get('model', 'gpt-3.5-turbo'),
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+
+class MockConfig:
+    """Mock behaviour: answer text, timing and failure rates.
+
+    latency_ms is the typical delay before the first token: the fixed value
+    for 'constant', the centre of a +/- jitter band for 'uniform', the median
+    for 'lognormal' (jitter is the sigma of its log) and the mean for
+    'exponential'. Each error rate is a separate share of all requests.
+    """
+
+    def __init__(self, latency_ms=300.0, token_delay_ms=20.0, answer=MOCK_ANSWER, latency_distribution='constant',
+                 latency_jitter=0.5, error_rate=0.0, rate_limit_rate=0.0, disconnect_rate=0.0, retry_after=1,
+                 seed=None):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f'latency_distribution must be one of {LATENCY_DISTRIBUTIONS}')
+        if error_rate + rate_limit_rate + disconnect_rate > 1:
+            raise ValueError('error rates add up to more than 1')
+        self.latency = latency_ms / 1000
+        self.token_delay = token_delay_ms / 1000
+        self.latency_distribution = latency_distribution
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.disconnect_rate = disconnect_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Roughly word-sized tokens, each keeping its leading space like the real tokenizer
+        words = answer.split(' ')
+        self.answer_tokens = [words[0]] + [' ' + word for word in words[1:]]
+
+    def tokens(self, payload):
+        return self.answer_tokens[:payload.get('max_tokens') or len(self.answer_tokens)]
+
+    def sample_latency(self):
+        with self._lock:
+            if self.latency_distribution == 'uniform':
+                return self.latency * self._random.uniform(1 - self.latency_jitter, 1 + self.latency_jitter)
+            if self.latency_distribution == 'lognormal':
+                return self.latency * self._random.lognormvariate(0, self.latency_jitter)
+            if self.latency_distribution == 'exponential':
+                return self._random.expovariate(1 / self.latency) if self.latency else 0.0
+            return self.latency
+
+    def outcome(self):
+        with self._lock:
+            draw = self._random.random()
+        for outcome, rate in ((SERVER_ERROR, self.error_rate), (RATE_LIMITED, self.rate_limit_rate),
+                              (DISCONNECT, self.disconnect_rate)):
+            if draw < rate:
+                return outcome
+            draw -= rate
+        return OK
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once
+    request_queue_size = 1024
+
+def make_server(port=8001, host='127.0.0.1', config=None):
+    handler = type('Handler', (MockOpenAIHandler,), {'config': config or MockConfig(), 'stats': MockStats()})
+    return MockServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency-ms', type=float, default=300.0, help='delay before the first token')
+    parser.add_argument('--token-delay-ms', type=float, default=20.0, help='delay between tokens')
+    parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='constant')
+    parser.add_argument('--latency-jitter', type=float, default=0.5,
+                        help='relative spread for uniform, log-space sigma for lognormal')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share answered with 429')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='share whose connection drops (streams are cut off halfway)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429s')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    config = MockConfig(args.latency_ms, args.token_delay_ms, latency_distribution=args.latency_distribution,
+                        latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, disconnect_rate=args.disconnect_rate,
+                        retry_after=args.retry_after, seed=args.seed)
+    server = make_server(args.port, args.host, config)
+    print(f'Mock OpenAI API on http://{args.host}:{args.port}/v1')
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
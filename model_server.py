@@ -0,0 +1,167 @@
+"""Out-of-process maternal risk model server over a Unix domain socket.
+
+The server owns the model so web workers don't need to import sklearn or hold
+the forest in memory. Each request is one frame:
+
+    request:  uint32 n_rows, then n_rows * 5 float64 features (little-endian)
+    response: uint8 status, uint32 n_rows, then n_rows uint8 predictions
+
+Status is 0 on success, 1 when no model is loaded and 2 on a malformed request.
+Connections are persistent and may carry any number of requests.
+
+Run:
+    python model_server.py --socket /tmp/maa-model.sock
+"""
+import argparse
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+MODEL_SERVER_SOCKET = os.getenv('MODEL_SERVER_SOCKET')
+MODEL_SERVER_TIMEOUT = float(os.getenv('MODEL_SERVER_TIMEOUT_MS', '200')) / 1000
+# After a failure, skip the server for this long instead of paying a timeout per request
+MODEL_SERVER_RETRY_AFTER = 1.0
+MAX_ROWS = 65536
+N_FEATURES = 5
+
+STATUS_OK = 0
+STATUS_NO_MODEL = 1
+STATUS_BAD_REQUEST = 2
+
+REQUEST_HEADER = struct.Struct('<I')
+RESPONSE_HEADER = struct.Struct('<BI')
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError('connection closed')
+        received += n
+    return buf
+
+class ModelRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        import numpy as np
+        from model_utils import get_current_models, predict_risk
+        sock = self.request
+        while True:
+            try:
+                (n_rows,) = REQUEST_HEADER.unpack(_recv_exact(sock, REQUEST_HEADER.size))
+            except ConnectionError:
+                return
+            if n_rows > MAX_ROWS:
+                sock.sendall(RESPONSE_HEADER.pack(STATUS_BAD_REQUEST, 0))
+                return
+            payload = _recv_exact(sock, n_rows * N_FEATURES * 8)
+            model, scaler, _ = get_current_models()
+            if model is None:
+                sock.sendall(RESPONSE_HEADER.pack(STATUS_NO_MODEL, 0))
+                continue
+            rows = np.frombuffer(payload, dtype='<f8').reshape(n_rows, N_FEATURES)
+            predictions = predict_risk(model, scaler, rows).astype(np.uint8) if n_rows else np.empty(0, np.uint8)
+            sock.sendall(RESPONSE_HEADER.pack(STATUS_OK, n_rows) + predictions.tobytes())
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(socket_path):
+    from model_utils import get_current_models
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # Load before accepting connections so the first request isn't slow
+    get_current_models()
+    with ModelServer(socket_path, ModelRequestHandler) as server:
+        print(f'Model server listening on {socket_path}')
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+class ModelClient:
+    """Client for the model server with per-thread connection reuse.
+
+    fallback is called with the same rows when the server is unavailable and
+    should predict in-process (or return None when there is no model at all).
+    """
+
+    def __init__(self, socket_path, fallback=None, timeout=MODEL_SERVER_TIMEOUT):
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self.timeout = timeout
+        self._local = threading.local()
+        self._down_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, rows):
+        sock = self._connection()
+        flat = [float(value) for row in rows for value in row]
+        sock.sendall(REQUEST_HEADER.pack(len(rows)) + struct.pack(f'<{len(flat)}d', *flat))
+        status, n_rows = RESPONSE_HEADER.unpack(_recv_exact(sock, RESPONSE_HEADER.size))
+        if status == STATUS_NO_MODEL:
+            return None
+        if status != STATUS_OK:
+            raise ConnectionError(f'model server returned status {status}')
+        return list(_recv_exact(sock, n_rows))
+
+    def predict(self, rows):
+        """Predict a batch of rows; returns a list of ints, or None if no model is available."""
+        if time.monotonic() >= self._down_until:
+            self.requests += 1
+            try:
+                predictions = self._request(rows)
+                if predictions is not None:
+                    return predictions
+            except (OSError, ConnectionError):
+                # Drop the connection: a timed-out reply would desync the next request
+                self._close()
+                self.failures += 1
+                self._down_until = time.monotonic() + MODEL_SERVER_RETRY_AFTER
+        if self.fallback is None:
+            return None
+        self.fallbacks += 1
+        return self.fallback(rows)
+
+    def predict_one(self, features):
+        predictions = self.predict([features])
+        return predictions[0] if predictions else None
+
+    def stats(self):
+        return {
+            'socket': self.socket_path,
+            'requests': self.requests,
+            'failures': self.failures,
+            'fallbacks': self.fallbacks,
+            'server_up': time.monotonic() >= self._down_until,
+        }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the maternal risk model over a Unix socket.')
+    parser.add_argument('--socket', default=MODEL_SERVER_SOCKET or '/tmp/maa-model.sock')
+    serve(parser.parse_args().socket)
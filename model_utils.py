@@ -1,33 +1,260 @@
+import csv
+import itertools
+import json
+import os
 import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-
-def train_maternal_risk_model():
-    # Dummy training data
-    X = np.random.rand(100, 5)  # age, bmi, bp, hb, sugar
-    y = np.random.randint(0, 2, 100)  # 0: low risk, 1: high risk
-    
+from database_utils import DATABASE_PATH
+
+MODEL_DIR = 'models'
+MODEL_PATH = os.path.join(MODEL_DIR, 'maternal_risk_model.pkl')
+SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.pkl')
+
+FEATURE_NAMES = ['age', 'bmi', 'bp', 'hb', 'sugar']
+# Decimal places kept per feature; finer differences don't change clinical meaning
+FEATURE_DECIMALS = (0, 1, 0, 1, 0)
+
+# Fixed histogram range per feature for the training/serving distribution sketches
+FEATURE_RANGES = ((15, 50), (14, 45), (80, 200), (5, 17), (50, 300))
+SKETCH_BINS = 20
+SKETCH_PATH = os.path.join(MODEL_DIR, 'training_sketch.json')
+
+TRAINING_CHUNK_SIZE = 100_000
+# Default database source for labeled vitals (label: 0 low risk, 1 high risk)
+TRAINING_QUERY = 'SELECT age, bmi, bp, hb, sugar, label FROM training_vitals'
+
+def synthetic_vitals(n_rows, seed=None):
+    """Generate plausible maternal vitals with rule-based risk labels for demos and benchmarks."""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.normal(28, 6, n_rows).clip(15, 50),      # age
+        rng.normal(24, 4, n_rows).clip(14, 45),      # bmi
+        rng.normal(118, 15, n_rows).clip(80, 200),   # systolic bp
+        rng.normal(11.5, 1.5, n_rows).clip(5, 17),   # hb
+        rng.normal(100, 25, n_rows).clip(50, 300),   # sugar
+    ])
+    score = ((X[:, 0] - 35) / 5 + (X[:, 1] - 30) / 4 + (X[:, 2] - 140) / 10
+             + (10 - X[:, 3]) + (X[:, 4] - 140) / 20 + rng.normal(0, 1, n_rows))
+    y = (score > -6).astype(np.int64)
+    return X, y
+
+def iter_synthetic_chunks(n_rows, chunk_size=TRAINING_CHUNK_SIZE, seed=0):
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_size):
+        yield synthetic_vitals(min(chunk_size, n_rows - start), seed=rng.integers(2**32))
+
+def iter_csv_chunks(path, chunk_size=TRAINING_CHUNK_SIZE):
+    """Stream (X, y) chunks from a CSV with columns age, bmi, bp, hb, sugar, label."""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        columns = [header.index(name) for name in FEATURE_NAMES + ['label']]
+        while True:
+            rows = [[row[i] for i in columns] for row in itertools.islice(reader, chunk_size)]
+            if not rows:
+                break
+            data = np.array(rows, dtype=np.float64)
+            yield data[:, :-1], data[:, -1].astype(np.int64)
+
+def iter_db_chunks(query=TRAINING_QUERY, chunk_size=TRAINING_CHUNK_SIZE, database_path=None):
+    """Stream (X, y) chunks of labeled vitals from the application database."""
+    conn = sqlite3.connect(database_path or DATABASE_PATH)
+    try:
+        cursor = conn.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            data = np.array(rows, dtype=np.float64)
+            yield data[:, :-1], data[:, -1].astype(np.int64)
+    finally:
+        conn.close()
+
+def sketch_bin_indices(X):
+    """Histogram bin per value: 0 is below range, SKETCH_BINS + 1 above it."""
+    lows = np.array([lo for lo, _ in FEATURE_RANGES], dtype=np.float64)
+    widths = np.array([(hi - lo) / SKETCH_BINS for lo, hi in FEATURE_RANGES], dtype=np.float64)
+    return np.clip(np.floor((X - lows) / widths).astype(np.int64) + 1, 0, SKETCH_BINS + 1)
+
+def update_sketch(counts, X):
+    """Add a chunk of rows to per-feature histogram counts of shape (features, SKETCH_BINS + 2)."""
+    bins = sketch_bin_indices(X)
+    for i in range(counts.shape[0]):
+        counts[i] += np.bincount(bins[:, i], minlength=SKETCH_BINS + 2)
+    return counts
+
+def load_training_sketch(path=SKETCH_PATH):
+    try:
+        with open(path) as f:
+            return np.array(json.load(f)['counts'], dtype=np.int64)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+def train_from_chunks(chunks, n_estimators=100, max_depth=None, n_jobs=-1, random_state=None):
+    """Fit the scaler incrementally over streamed chunks, then fit the forest on all cores.
+
+    Returns (model, scaler, report) where report holds per-stage timings and the
+    training-set feature sketch used for drift monitoring.
+    """
+    # Imported here so serving processes that never train don't pay for sklearn at import time
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    report = {}
+    start = time.perf_counter()
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    model = RandomForestClassifier()
+    sketch = np.zeros((len(FEATURE_NAMES), SKETCH_BINS + 2), dtype=np.int64)
+    X_parts, y_parts = [], []
+    for X, y in chunks:
+        scaler.partial_fit(X)
+        update_sketch(sketch, X)
+        # The forest works in float32 internally, so store chunks that way
+        X_parts.append(X.astype(np.float32))
+        y_parts.append(y)
+    if not X_parts:
+        raise ValueError('No training rows found.')
+    X = np.concatenate(X_parts)
+    y = np.concatenate(y_parts)
+    del X_parts, y_parts
+    report['rows'] = len(y)
+    report['load_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X_scaled = scaler.transform(X).astype(np.float32)
+    report['scale_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
+                                   n_jobs=n_jobs, random_state=random_state)
     model.fit(X_scaled, y)
-    
-    # Save model and scaler
-    with open('models/maternal_risk_model.pkl', 'wb') as f:
-        pickle.dump(model, f)
-    with open('models/scaler.pkl', 'wb') as f:
-        pickle.dump(scaler, f)
-    
+    # Serving predicts a row or a small batch at a time, where a thread pool per call only adds overhead
+    model.set_params(n_jobs=1)
+    report['fit_seconds'] = time.perf_counter() - start
+    report['n_jobs'] = n_jobs if n_jobs > 0 else os.cpu_count()
+    report['n_estimators'] = n_estimators
+    report['max_depth'] = max_depth
+    report['rows_per_second'] = report['rows'] / (report['load_seconds'] + report['scale_seconds'] + report['fit_seconds'])
+    report['feature_sketch'] = sketch.tolist()
+    return model, scaler, report
+
+def atomic_write(path, data):
+    """Write bytes to path so readers see the old file or the new one, never a partial write."""
+    # Write next to the target and rename
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def save_models(model, scaler, report=None, model_dir=MODEL_DIR):
+    """Write a versioned copy of the artifacts and atomically promote it to the live paths."""
+    version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    version_dir = os.path.join(model_dir, 'versions', version)
+    os.makedirs(version_dir, exist_ok=True)
+    model_bytes = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    scaler_bytes = pickle.dumps(scaler, protocol=pickle.HIGHEST_PROTOCOL)
+    report = dict(report or {}, version=version)
+    sketch = report.pop('feature_sketch', None)
+
+    start = time.perf_counter()
+    atomic_write(os.path.join(version_dir, os.path.basename(MODEL_PATH)), model_bytes)
+    atomic_write(os.path.join(version_dir, os.path.basename(SCALER_PATH)), scaler_bytes)
+    if sketch is not None:
+        sketch_bytes = json.dumps({'ranges': FEATURE_RANGES, 'bins': SKETCH_BINS, 'counts': sketch}).encode()
+        atomic_write(os.path.join(version_dir, os.path.basename(SKETCH_PATH)), sketch_bytes)
+        atomic_write(os.path.join(model_dir, os.path.basename(SKETCH_PATH)), sketch_bytes)
+    # Scaler first: a reader catching the gap sees a changed version again once the model lands
+    atomic_write(os.path.join(model_dir, os.path.basename(SCALER_PATH)), scaler_bytes)
+    atomic_write(os.path.join(model_dir, os.path.basename(MODEL_PATH)), model_bytes)
+    report['save_seconds'] = time.perf_counter() - start
+    report['artifact_bytes'] = len(model_bytes) + len(scaler_bytes)
+    atomic_write(os.path.join(version_dir, 'training_report.json'), json.dumps(report, indent=2).encode())
+    return version, report
+
+def train_maternal_risk_model(source=None, chunk_size=TRAINING_CHUNK_SIZE, n_estimators=100,
+                              max_depth=None, n_jobs=-1):
+    """Train the maternal risk model and save it as the live, versioned artifact.
+
+    source is a CSV path, 'db' for the training_vitals table, or None for
+    synthetic demo data.
+    """
+    if source is None:
+        chunks = iter_synthetic_chunks(10_000, chunk_size)
+    elif source == 'db':
+        chunks = iter_db_chunks(chunk_size=chunk_size)
+    else:
+        chunks = iter_csv_chunks(source, chunk_size)
+
+    model, scaler, report = train_from_chunks(chunks, n_estimators=n_estimators,
+                                              max_depth=max_depth, n_jobs=n_jobs)
+    report['source'] = source or 'synthetic'
+    save_models(model, scaler, report)
     return model, scaler
 
-def load_models():
+def load_models(model_dir=MODEL_DIR):
     try:
-        with open('models/maternal_risk_model.pkl', 'rb') as f:
+        with open(os.path.join(model_dir, os.path.basename(MODEL_PATH)), 'rb') as f:
             model = pickle.load(f)
-        with open('models/scaler.pkl', 'rb') as f:
+        with open(os.path.join(model_dir, os.path.basename(SCALER_PATH)), 'rb') as f:
             scaler = pickle.load(f)
         return model, scaler
     except FileNotFoundError:
         return None, None
+
+def get_model_version():
+    """Return a cheap identifier for the model artifacts on disk, or None if missing."""
+    try:
+        model_stat = os.stat(MODEL_PATH)
+        scaler_stat = os.stat(SCALER_PATH)
+    except FileNotFoundError:
+        return None
+    return f'{model_stat.st_mtime_ns}-{model_stat.st_size}-{scaler_stat.st_mtime_ns}'
+
+# Currently loaded (version, model, scaler), replaced as a whole so readers always get a matching set
+_current = (None, None, None)
+_current_lock = threading.Lock()
+
+def get_current_models():
+    """Return (model, scaler, version), reloading the artifacts if they changed on disk."""
+    global _current
+    version = get_model_version()
+    current = _current
+    if version != current[0]:
+        with _current_lock:
+            current = _current
+            if version != current[0]:
+                model, scaler = load_models()
+                current = _current = (version if model is not None else None, model, scaler)
+    return current[1], current[2], current[0]
+
+def normalize_features(features):
+    """Round raw vitals to the precision used for prediction and caching.
+
+    Predictions are made on the rounded values (whole years, mmHg and mg/dL;
+    BMI and Hb to one decimal), so inputs that differ only below that
+    precision get the same answer and share a cache entry. Every scoring
+    path must round the same way.
+    """
+    return tuple(round(float(value), decimals) for value, decimals in zip(features, FEATURE_DECIMALS))
+
+def normalize_feature_rows(rows):
+    """normalize_features for a batch of rows, as a float64 matrix ready for predict_risk."""
+    return np.array([normalize_features(row) for row in rows], dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+
+def predict_risk(model, scaler, rows):
+    """Predict risk classes (0: low, 1: high) for a batch of feature rows."""
+    X = scaler.transform(np.asarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_NAMES)))
+    return model.predict(X)
+
+def risk_label(prediction):
+    return 'High Risk' if prediction == 1 else 'Low Risk'
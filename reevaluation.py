@@ -0,0 +1,104 @@
+import itertools
+import os
+import threading
+import time
+
+from database_utils import get_mother_vitals, update_patient_risk_levels
+from metrics_utils import LatencyHistogram
+from model_utils import get_current_models, normalize_feature_rows, predict_risk, risk_label
+
+REEVALUATION_BATCH_SIZE = int(os.getenv('REEVALUATION_BATCH_SIZE', '500'))
+# Short pause after the first pending id so bursts of writes share one batch
+REEVALUATION_DELAY = float(os.getenv('REEVALUATION_DELAY_MS', '50')) / 1000
+
+class RiskReevaluator:
+    """Re-scores patients in the background when new vitals are written for them.
+
+    Patient ids are de-duplicated while pending, scored in vectorized batches from
+    their latest vitals (the patients columns, as rescore_patients reads them),
+    and risk_level is only written when it changes.
+    """
+
+    def __init__(self, batch_size=REEVALUATION_BATCH_SIZE, delay=REEVALUATION_DELAY):
+        self.batch_size = batch_size
+        self.delay = delay
+        # patient_id -> time of the first write not yet scored (dicts keep insertion order)
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self.lag = LatencyHistogram()
+        self.enqueued = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.scored = 0
+        self.changed = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='risk-reevaluator', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, patient_ids):
+        now = time.monotonic()
+        with self._cond:
+            self._ensure_started()
+            for patient_id in patient_ids:
+                self.enqueued += 1
+                if patient_id in self._pending:
+                    self.deduplicated += 1
+                else:
+                    self._pending[patient_id] = now
+            self._cond.notify()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+        time.sleep(self.delay)
+        with self._cond:
+            ids = list(itertools.islice(self._pending, self.batch_size))
+            return {patient_id: self._pending.pop(patient_id) for patient_id in ids}
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                print(f"Error in risk re-evaluation: {e}")
+                self.errors += 1
+
+    def _process(self, batch):
+        model, scaler, _ = get_current_models()
+        if model is None:
+            return
+        rows = get_mother_vitals(batch)
+        if rows:
+            features = normalize_feature_rows(row[1:6] for row in rows)
+            labels = [risk_label(p) for p in predict_risk(model, scaler, features)]
+            updates = [(label, row[0]) for row, label in zip(rows, labels) if label != row[6]]
+            if updates:
+                update_patient_risk_levels(updates)
+            self.scored += len(rows)
+            self.changed += len(updates)
+        self.batches += 1
+        now = time.monotonic()
+        for enqueued_at in batch.values():
+            self.lag.observe(now - enqueued_at)
+
+    def stats(self):
+        with self._cond:
+            depth = len(self._pending)
+            oldest = min(self._pending.values(), default=None)
+        return {
+            'queue_depth': depth,
+            'oldest_pending_seconds': time.monotonic() - oldest if oldest is not None else 0.0,
+            'enqueued': self.enqueued,
+            'deduplicated': self.deduplicated,
+            'batches': self.batches,
+            'scored': self.scored,
+            'changed': self.changed,
+            'errors': self.errors,
+            'end_to_end_lag': self.lag.stats(),
+        }
@@ -0,0 +1,114 @@
+"""Re-score stored patient vitals with the current maternal risk model.
+
+The stored vitals are each patient's latest reading, which add_vitals_batch
+keeps up to date as readings are ingested. They are rounded with
+normalize_features like /maternal inputs, so both paths score them alike.
+
+Patients are read in id order (keyset pagination), each chunk is scored with
+one vectorized predict, and changed risk levels are written back in one
+transaction per chunk. Progress is checkpointed so an interrupted run resumes
+where it stopped, as long as the model version is unchanged.
+
+Examples:
+    python rescore_patients.py
+    python rescore_patients.py --chunk-size 2000 --max-rows-per-sec 5000
+    python rescore_patients.py --restart
+"""
+import argparse
+import json
+import os
+import time
+
+from database_utils import get_patient_vitals_chunk, update_patient_risk_levels
+from model_utils import get_current_models, normalize_feature_rows, predict_risk, risk_label
+
+CHECKPOINT_PATH = 'models/rescore_checkpoint.json'
+
+def load_checkpoint(path, model_version):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return 0
+    # A checkpoint from another model version means everything must be re-scored
+    if checkpoint.get('model_version') != model_version:
+        return 0
+    return checkpoint.get('last_id', 0)
+
+def save_checkpoint(path, model_version, last_id):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'model_version': model_version, 'last_id': last_id}, f)
+    os.replace(tmp_path, path)
+
+def rescore_patients(chunk_size=1000, max_rows_per_sec=None, checkpoint_path=CHECKPOINT_PATH,
+                     restart=False, dry_run=False, log=print):
+    """Re-score all mothers with stored vitals; returns a summary dict."""
+    model, scaler, model_version = get_current_models()
+    if model is None:
+        raise RuntimeError('No maternal risk model found; train one first.')
+
+    last_id = 0 if restart else load_checkpoint(checkpoint_path, model_version)
+    if last_id:
+        log(f'Resuming after patient id {last_id}')
+
+    scanned = changed = 0
+    start = time.perf_counter()
+    while True:
+        chunk_start = time.perf_counter()
+        rows = get_patient_vitals_chunk(last_id, chunk_size)
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        features = normalize_feature_rows(row[1:6] for row in rows)
+        current = [row[6] for row in rows]
+
+        labels = [risk_label(prediction) for prediction in predict_risk(model, scaler, features)]
+        updates = [(label, patient_id) for patient_id, label, old in zip(ids, labels, current) if label != old]
+        if updates and not dry_run:
+            update_patient_risk_levels(updates)
+
+        last_id = ids[-1]
+        scanned += len(rows)
+        changed += len(updates)
+        if not dry_run:
+            save_checkpoint(checkpoint_path, model_version, last_id)
+
+        elapsed = time.perf_counter() - start
+        log(f'scanned {scanned} changed {changed} last_id {last_id} ({scanned / elapsed:.0f} rows/s)')
+
+        # Throttle so online traffic keeps getting the database
+        if max_rows_per_sec:
+            budget = len(rows) / max_rows_per_sec
+            spent = time.perf_counter() - chunk_start
+            if budget > spent:
+                time.sleep(budget - spent)
+
+    # A finished run starts from the beginning next time
+    if not dry_run and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'model_version': model_version,
+        'scanned': scanned,
+        'changed': changed,
+        'seconds': elapsed,
+        'rows_per_second': scanned / elapsed if elapsed else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score stored patient vitals with the current model.')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--max-rows-per-sec', type=float, default=None, help='throttle rate (default: unthrottled)')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--restart', action='store_true', help='ignore any saved checkpoint')
+    parser.add_argument('--dry-run', action='store_true', help='score without writing changes')
+    args = parser.parse_args()
+
+    summary = rescore_patients(args.chunk_size, args.max_rows_per_sec, args.checkpoint,
+                               args.restart, args.dry_run)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import itertools
+import os
+import threading
+import time
+import numpy as np
+
+from model_utils import FEATURE_NAMES, predict_risk, synthetic_vitals
+
+# (min, max, step) per feature: age, bmi, systolic bp, hb, sugar
+DEFAULT_GRID_SPEC = (
+    (15, 50, 1),
+    (14, 45, 1),
+    (80, 200, 5),
+    (5, 17, 0.5),
+    (50, 300, 10),
+)
+GRID_BUILD_CHUNK = 200_000
+# Table value of a cell whose corners disagree
+MIXED_CELL = 255
+
+class RiskGrid:
+    """Model predictions precomputed over the cells of a quantized 5-D grid of vitals.
+
+    The model is evaluated at every grid point. A cell whose 32 corners all
+    get the same prediction stores it, so a lookup is one index computation;
+    cells with disagreeing corners straddle a decision boundary and, like
+    inputs outside the grid, return None and need the full model.
+    """
+
+    def __init__(self, spec=DEFAULT_GRID_SPEC):
+        self.mins = np.array([s[0] for s in spec], dtype=np.float64)
+        self.maxs = np.array([s[1] for s in spec], dtype=np.float64)
+        self.steps = np.array([s[2] for s in spec], dtype=np.float64)
+        self.points_shape = tuple(int(round((hi - lo) / step)) + 1 for lo, hi, step in spec)
+        self.shape = tuple(n - 1 for n in self.points_shape)
+        self.strides = tuple(int(np.prod(self.shape[i + 1:])) for i in range(len(self.shape)))
+        # Plain tuples keep the single-row lookup free of NumPy scalar overhead
+        self._bounds = tuple((float(lo), float(hi), float(step), n - 1, stride)
+                             for (lo, hi, step), n, stride in zip(spec, self.shape, self.strides))
+        self.table = None
+        self.model_version = None
+        self.build_seconds = None
+        self.mixed_cell_rate = None
+        self.disagreement_rate = None
+        self.hits = 0
+        self.mixed = 0
+        self.out_of_range = 0
+
+    def build(self, model, scaler, model_version=None):
+        """Evaluate the model at every grid point and keep the cells whose corners agree."""
+        start = time.perf_counter()
+        size = int(np.prod(self.points_shape))
+        points = np.empty(size, dtype=np.uint8)
+        for offset in range(0, size, GRID_BUILD_CHUNK):
+            flat = np.arange(offset, min(offset + GRID_BUILD_CHUNK, size))
+            coords = np.column_stack(np.unravel_index(flat, self.points_shape))
+            points[offset:offset + len(flat)] = predict_risk(model, scaler, self.mins + coords * self.steps)
+        points = points.reshape(self.points_shape)
+        low = high = None
+        for corner in itertools.product((0, 1), repeat=len(self.shape)):
+            view = points[tuple(slice(c, c + n) for c, n in zip(corner, self.shape))]
+            if low is None:
+                low, high = view.copy(), view.copy()
+            else:
+                np.minimum(low, view, out=low)
+                np.maximum(high, view, out=high)
+        mixed = low != high
+        low[mixed] = MIXED_CELL
+        self.table = low.ravel()
+        self.mixed_cell_rate = float(np.mean(mixed))
+        self.model_version = model_version
+        self.build_seconds = time.perf_counter() - start
+        return self
+
+    def lookup(self, features):
+        """Return the grid prediction for one row, or None if the model must decide."""
+        index = 0
+        for value, (lo, hi, step, last, stride) in zip(features, self._bounds):
+            if not lo <= value <= hi:
+                self.out_of_range += 1
+                return None
+            index += min(int((value - lo) / step), last) * stride
+        prediction = int(self.table[index])
+        if prediction == MIXED_CELL:
+            self.mixed += 1
+            return None
+        self.hits += 1
+        return prediction
+
+    def lookup_batch(self, X):
+        """Vectorized lookup; returns (predictions, mask of rows the grid answered)."""
+        X = np.asarray(X, dtype=np.float64)
+        in_range = np.all((X >= self.mins) & (X <= self.maxs), axis=1)
+        coords = np.minimum(np.floor((X[in_range] - self.mins) / self.steps).astype(np.int64),
+                            np.array(self.shape, dtype=np.int64) - 1)
+        predictions = np.zeros(len(X), dtype=np.uint8)
+        predictions[in_range] = self.table[coords @ np.array(self.strides, dtype=np.int64)]
+        answered = in_range & (predictions != MIXED_CELL)
+        predictions[~answered] = 0
+        return predictions, answered
+
+    def measure_disagreement(self, model, scaler, samples=20_000):
+        """Share of grid-answered synthetic vitals where the grid and the model disagree."""
+        X, _ = synthetic_vitals(samples, seed=0)
+        grid_predictions, answered = self.lookup_batch(X)
+        model_predictions = predict_risk(model, scaler, X[answered])
+        self.disagreement_rate = float(np.mean(grid_predictions[answered] != model_predictions))
+        return self.disagreement_rate
+
+    def stats(self):
+        return {
+            'model_version': self.model_version,
+            'shape': dict(zip(FEATURE_NAMES, self.shape)),
+            'cells': int(np.prod(self.shape)),
+            'memory_bytes': int(self.table.nbytes) if self.table is not None else 0,
+            'build_seconds': self.build_seconds,
+            'mixed_cell_rate': self.mixed_cell_rate,
+            'disagreement_rate': self.disagreement_rate,
+            'hits': self.hits,
+            'mixed': self.mixed,
+            'out_of_range': self.out_of_range,
+        }
+
+class RiskGridManager:
+    """Keeps a RiskGrid in step with the live model, rebuilding it in the background."""
+
+    def __init__(self, spec=DEFAULT_GRID_SPEC):
+        self.spec = spec
+        self.grid = None
+        self.rebuilds = 0
+        self._building = None
+        self._lock = threading.Lock()
+
+    def get(self, model, scaler, model_version):
+        """Return a grid for model_version, or None while it is being (re)built.
+
+        Only one build runs at a time; a version that goes live during a build
+        is picked up by the first call after that build finishes.
+        """
+        grid = self.grid
+        if grid is not None and grid.model_version == model_version:
+            return grid
+        if model is None:
+            return None
+        with self._lock:
+            if self._building is None:
+                self._building = model_version
+                threading.Thread(target=self._rebuild, args=(model, scaler, model_version),
+                                 name='risk-grid-build', daemon=True).start()
+        return None
+
+    def _rebuild(self, model, scaler, model_version):
+        try:
+            grid = RiskGrid(self.spec).build(model, scaler, model_version)
+            grid.measure_disagreement(model, scaler)
+        except Exception as e:
+            print(f"Error building risk grid: {e}")
+        else:
+            self.grid = grid
+            self.rebuilds += 1
+        finally:
+            with self._lock:
+                self._building = None
+
+    def stats(self):
+        result = self.grid.stats() if self.grid is not None else {}
+        result['rebuilds'] = self.rebuilds
+        result['building'] = self._building is not None
+        return result
+
+def load_risk_grid_manager():
+    """Return a RiskGridManager if RISK_GRID=1, else None."""
+    if os.getenv('RISK_GRID') != '1':
+        return None
+    return RiskGridManager()
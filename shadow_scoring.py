@@ -0,0 +1,117 @@
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+from metrics_utils import LatencyHistogram
+from model_utils import load_models, predict_risk
+
+SHADOW_MODEL_DIR = os.getenv('SHADOW_MODEL_DIR')
+SHADOW_WORKERS = int(os.getenv('SHADOW_WORKERS', '1'))
+SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', '1024'))
+# Where a served production prediction came from
+PRODUCTION_SOURCES = ('grid', 'cache', 'model')
+
+class ShadowScorer:
+    """Scores production traffic with a candidate model off the request path.
+
+    Work goes through a bounded queue to a small pool of daemon threads; when the
+    queue is full the sample is dropped rather than slowing the request down.
+
+    Latency is recorded per served row: production latency for every served
+    prediction by source (grid, cache or model), and candidate latency for
+    scoring one row at a time, which compares with production 'model'.
+    """
+
+    def __init__(self, model, scaler, workers=SHADOW_WORKERS, max_queue=SHADOW_QUEUE_SIZE):
+        self.model = model
+        self.scaler = scaler
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.production_latency = {source: LatencyHistogram() for source in PRODUCTION_SOURCES}
+        self.candidate_latency = LatencyHistogram()
+        self.submitted = 0
+        self.dropped = 0
+        self.errors = 0
+        # confusion[production][candidate]
+        self.confusion = [[0, 0], [0, 0]]
+
+    def _ensure_started(self):
+        if len(self._threads) == self.workers and all(t.is_alive() for t in self._threads):
+            return
+        with self._start_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, features, production_prediction):
+        """Queue one scored row for the candidate model; never blocks."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((features, int(production_prediction)))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def observe_production(self, source, seconds):
+        """Record how long a served production prediction took, by where it came from."""
+        self.production_latency[source].observe(seconds)
+
+    def _run(self):
+        while True:
+            features, production = self._queue.get()
+            # One row per call, as production scores a request, so the latencies compare
+            try:
+                start = time.perf_counter()
+                candidate = int(predict_risk(self.model, self.scaler, np.array([features]))[0])
+                self.candidate_latency.observe(time.perf_counter() - start)
+            except Exception as e:
+                print(f"Error in shadow scorer: {e}")
+                with self._stats_lock:
+                    self.errors += 1
+                continue
+            with self._stats_lock:
+                self.confusion[production][candidate] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            (both_low, cand_high), (cand_low, both_high) = self.confusion
+            scored = both_low + cand_high + cand_low + both_high
+            result = {
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'queue_depth': self._queue.qsize(),
+                'scored': scored,
+                'agreement_rate': (both_low + both_high) / scored if scored else None,
+                'confusion': {
+                    'both_low': both_low,
+                    'both_high': both_high,
+                    'production_low_candidate_high': cand_high,
+                    'production_high_candidate_low': cand_low,
+                },
+            }
+        result['production_latency'] = {source: histogram.stats()
+                                        for source, histogram in self.production_latency.items()}
+        result['candidate_latency'] = self.candidate_latency.stats()
+        return result
+
+def load_shadow_scorer(model_dir=SHADOW_MODEL_DIR):
+    """Build a ShadowScorer for the candidate artifacts in model_dir, or None if not configured."""
+    if not model_dir:
+        return None
+    model, scaler = load_models(model_dir)
+    if model is None:
+        print(f"Shadow model not found in {model_dir}; shadow scoring disabled")
+        return None
+    return ShadowScorer(model, scaler)
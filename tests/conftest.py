@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app builds its OpenAI client when imported; tests give their services clients for mock servers
+os.environ.setdefault('OPENAI_API_KEY', 'mock')
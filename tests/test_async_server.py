@@ -0,0 +1,117 @@
+"""HTTP behaviour of the async server: keep-alive, body limits, the session cookie and SSE.
+
+The server runs on its own event loop thread against the Flask app and a mock
+OpenAI API that answers at once.
+"""
+import asyncio
+import http.client
+import json
+import os
+import threading
+
+import pytest
+from openai import AsyncOpenAI
+
+from chat_memory import ChatMemory
+from chat_service import AsyncChatService
+from mock_openai_server import MOCK_ANSWER, MockConfig, make_server
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    mock = make_server(0, config=MockConfig(0, 0))
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    tmp_path = tmp_path_factory.mktemp('async_app')
+    # The app keeps its SQLite database in the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    loop = asyncio.new_event_loop()
+    try:
+        import app as web
+        from async_server import AsyncChatServer
+        client = AsyncOpenAI(api_key='mock', base_url=f'http://127.0.0.1:{mock.server_address[1]}/v1')
+        service = AsyncChatService([client], memory=ChatMemory(str(tmp_path / 'chat_memory.db')))
+        chat_server = AsyncChatServer(web.app, service, wsgi_threads=2)
+        listener = loop.run_until_complete(asyncio.start_server(chat_server.handle_connection, '127.0.0.1', 0))
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        chat_server.port = listener.sockets[0].getsockname()[1]
+        yield chat_server
+        loop.call_soon_threadsafe(loop.stop)
+        mock.shutdown()
+    finally:
+        os.chdir(cwd)
+
+def connect(server):
+    return http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+
+def post_chat(conn, payload, cookie=None):
+    headers = {'Content-Type': 'application/json'}
+    if cookie:
+        headers['Cookie'] = cookie
+    conn.request('POST', '/chat', body=json.dumps(payload), headers=headers)
+    response = conn.getresponse()
+    return response, response.read()
+
+def test_keep_alive_serves_chat_and_flask_routes_on_one_connection(server):
+    conn = connect(server)
+    response, body = post_chat(conn, {'message': 'What should I eat?'})
+    assert response.status == 200 and json.loads(body)['response'] == MOCK_ANSWER
+    sock = conn.sock
+    conn.request('GET', '/no-such-page')
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 404
+    response, body = post_chat(conn, {})
+    assert response.status == 400
+    assert conn.sock is sock
+    conn.close()
+
+def test_oversized_bodies_get_413(server, monkeypatch):
+    monkeypatch.setattr('async_server.MAX_REQUEST_BODY', 1024)
+    conn = connect(server)
+    response, _ = post_chat(conn, {'message': 'x' * 2048})
+    assert response.status == 413
+    conn.close()
+    # A declared length over the limit is refused without waiting for the body
+    conn = connect(server)
+    conn.putrequest('POST', '/chat')
+    conn.putheader('Content-Length', str(10 ** 9))
+    conn.endheaders()
+    response = conn.getresponse()
+    assert response.status == 413
+    conn.close()
+
+def test_session_cookie_round_trip(server):
+    conn = connect(server)
+    response, _ = post_chat(conn, {'message': 'Is fish safe while pregnant?'})
+    set_cookie = response.getheader('Set-Cookie')
+    assert set_cookie
+    cookie = set_cookie.split(';', 1)[0]
+    name, value = cookie.split('=', 1)
+    session_id = server.sessions.serializer.loads(value)['chat_session_id']
+    assert server.chat_service.memory.has_history(session_id)
+
+    # The returned cookie keeps the conversation without issuing a new one
+    response, _ = post_chat(conn, {'message': 'And tuna?'}, cookie=cookie)
+    assert response.status == 200 and response.getheader('Set-Cookie') is None
+    conn.close()
+
+    # It is an ordinary Flask session cookie, so the Flask routes see the same conversation
+    app = server.app
+    with app.test_request_context('/', headers={'Cookie': cookie}):
+        from flask import request
+        session = app.session_interface.open_session(app, request)
+    assert name == app.config['SESSION_COOKIE_NAME'] and session['chat_session_id'] == session_id
+
+def test_streamed_answer_arrives_as_server_sent_events(server):
+    conn = connect(server)
+    response, body = post_chat(conn, {'message': 'What should I eat?', 'stream': True})
+    assert response.status == 200
+    assert response.getheader('Content-Type') == 'text/event-stream'
+    events = [event.split('\n') for event in body.decode().strip().split('\n\n')]
+    tokens = [json.loads(lines[0][len('data: '):])['token'] for lines in events[:-1]]
+    assert len(tokens) > 1 and ''.join(tokens) == MOCK_ANSWER
+    assert events[-1] == ['event: done', 'data: {}']
+    # The connection stays usable after a stream
+    response, _ = post_chat(conn, {'message': 'What should I eat?'})
+    assert response.status == 200
+    conn.close()
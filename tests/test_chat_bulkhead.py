@@ -0,0 +1,89 @@
+"""A flooded /chat with a slow upstream must not hold up other routes.
+
+Same setup as benchmarks/chat_bulkhead.py, made small enough for the test suite:
+the app runs on a fixed pool of worker threads against a mock OpenAI API that is
+slower than the test, /chat is flooded with more clients than there are workers,
+and /api/dashboard/stats is probed meanwhile.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+from openai import OpenAI
+
+from benchmarks.chat_bulkhead import PooledWSGIServer, timed_request
+from bulkhead import Bulkhead
+from chat_service import CHAT_QUEUE_TIMEOUT, ChatService
+from database_utils import init_db
+from mock_openai_server import MockConfig, make_server
+
+WORKERS = 6
+MAX_CONCURRENCY = 2
+CHAT_CLIENTS = 24
+UPSTREAM_LATENCY_MS = 4000.0
+FLOOD_SECONDS = 2.5
+# Without the bulkhead a probe waits for a worker to free up, i.e. for the upstream latency
+MAX_PROBE_SECONDS = 1.0
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    mock = make_server(0, config=MockConfig(UPSTREAM_LATENCY_MS, 0))
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+    # The app keeps its SQLite database in the working directory, and only creates it on first import
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    try:
+        import app as web
+        init_db()
+        # Every question goes upstream through a small bulkhead, whatever the app was configured with
+        client = OpenAI(api_key='mock', base_url=f'http://127.0.0.1:{mock.server_address[1]}/v1', timeout=30)
+        service = ChatService(client, bulkhead=Bulkhead(MAX_CONCURRENCY, CHAT_QUEUE_TIMEOUT))
+        with pytest.MonkeyPatch.context() as patch:
+            patch.setattr(web, 'chat_service', service)
+            server = PooledWSGIServer('127.0.0.1', 0, web.app, WORKERS)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            yield f'http://127.0.0.1:{server.port}'
+            server.shutdown()
+        mock.shutdown()
+    finally:
+        os.chdir(cwd)
+
+def test_dashboard_stays_responsive_while_chat_is_flooded(server):
+    deadline = time.perf_counter() + FLOOD_SECONDS
+    chat_statuses = Counter()
+    probe_statuses = []
+    probe_latencies = []
+    lock = threading.Lock()
+
+    def chat_client(i):
+        n = 0
+        while time.perf_counter() < deadline:
+            status, _ = timed_request(f'{server}/chat', {'message': f'client {i} question {n}'}, timeout=10)
+            n += 1
+            with lock:
+                chat_statuses[status] += 1
+            if status == 503:
+                time.sleep(0.2)
+
+    def prober():
+        while time.perf_counter() < deadline:
+            status, elapsed = timed_request(f'{server}/api/dashboard/stats', timeout=10)
+            probe_statuses.append(status)
+            probe_latencies.append(elapsed)
+            time.sleep(0.1)
+
+    clients = [threading.Thread(target=chat_client, args=(i,), daemon=True) for i in range(CHAT_CLIENTS)]
+    for t in clients:
+        t.start()
+    # Let the flood take the upstream slots before probing
+    time.sleep(0.3)
+    probe = threading.Thread(target=prober)
+    probe.start()
+    probe.join()
+
+    assert probe_statuses and set(probe_statuses) == {200}, probe_statuses
+    assert max(probe_latencies) < MAX_PROBE_SECONDS, probe_latencies
+    # Chats beyond the bulkhead were turned away quickly instead of taking workers
+    assert chat_statuses[503] > 0, dict(chat_statuses)
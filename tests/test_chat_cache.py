@@ -0,0 +1,43 @@
+"""Rewordings of a cached question are answered from the cache; different questions are not."""
+from types import SimpleNamespace
+
+import pytest
+
+from chat_cache import ChatResponseCache, normalize_message
+from chat_service import ChatService
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        message = SimpleNamespace(content=f'answer {self.calls}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+@pytest.mark.parametrize('question, rewording', [
+    ('Is fish safe while pregnant?', 'pregnant - fish safe?'),
+    ('How much iron do I need in pregnancy?', 'Pregnancy: how much iron do I need?'),
+    ('What is preeclampsia', 'what is PREECLAMPSIA?!'),
+])
+def test_rewordings_share_a_key(question, rewording):
+    assert normalize_message(question) == normalize_message(rewording)
+
+@pytest.mark.parametrize('question, other', [
+    ('Is fish safe while pregnant?', 'Is raw fish safe while pregnant?'),
+    ('Is fish safe while pregnant?', 'Is fish not safe while pregnant?'),
+    ('Can I take paracetamol while pregnant?', 'Can I take ibuprofen while pregnant?'),
+])
+def test_different_questions_get_different_keys(question, other):
+    assert normalize_message(question) != normalize_message(other)
+
+def test_reworded_question_is_answered_from_the_cache(tmp_path):
+    completions = FakeCompletions()
+    service = ChatService(SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+                          cache=ChatResponseCache(str(tmp_path / 'chat_cache.db')))
+    assert service.complete('Is fish safe while pregnant?') == 'answer 1'
+    assert service.complete('pregnant - fish safe?') == 'answer 1'
+    assert service.complete('Is raw fish safe while pregnant?') == 'answer 2'
+    assert completions.calls == 2
+    # With the API unavailable, only the same question gets a cached answer
+    assert service.fallback_answer('fish, safe while pregnant?') == 'answer 1'
@@ -0,0 +1,51 @@
+"""The FAQ may only answer a /chat question it fully covers; anything else goes to the API."""
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from chat_service import ChatService
+from faq_retrieval import FaqIndex, compile_index
+
+FAQ_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'maternal_faq.json')
+API_ANSWER = 'answer from the API'
+
+@pytest.fixture(scope='module')
+def faq():
+    with open(FAQ_PATH) as f:
+        return FaqIndex(compile_index(json.load(f)))
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **params):
+        self.calls += 1
+        message = SimpleNamespace(content=API_ANSWER)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+@pytest.mark.parametrize('question', [
+    # About the mother, but the closest entries are about a newborn or child
+    'yellow eyes in pregnancy',
+    'diarrhea in pregnancy',
+    'fever in pregnancy',
+    # About the baby, but the closest entry is about the mother
+    'is it safe for my baby to exercise',
+])
+def test_partial_matches_go_to_the_api(faq, question):
+    assert faq.answer(question) is None
+    completions = FakeCompletions()
+    service = ChatService(SimpleNamespace(chat=SimpleNamespace(completions=completions)), faq=faq)
+    assert service.complete(question) == API_ANSWER
+    assert completions.calls == 1
+
+@pytest.mark.parametrize('question, entry_id', [
+    ('Is it safe to exercise during pregnancy?', 'exercise'),
+    ('Is yellow skin in my newborn normal?', 'newborn-jaundice'),
+    ('newborn jaundice', 'newborn-jaundice'),
+    ('What should I do when my child has diarrhoea?', 'diarrhoea-child'),
+    ('how often antenatal visits', 'antenatal-visits'),
+])
+def test_fully_covered_questions_are_answered_locally(faq, question, entry_id):
+    assert faq.answer(question)['id'] == entry_id
@@ -0,0 +1,35 @@
+"""Ingested chunks are acked on commit, whatever happens to the risk and trend updates after."""
+import threading
+
+import pytest
+
+from ingestion import VitalsWriter
+
+READINGS = [(1, '2026-03-01 08:00:00', 30, 24.5, 120, 11.2, 95)]
+
+def test_ack_does_not_wait_for_or_fail_with_after_write():
+    release = threading.Event()
+    updated = threading.Event()
+
+    def after_write(stored):
+        release.wait(5)
+        updated.set()
+        raise RuntimeError('alerts table locked')
+
+    writer = VitalsWriter(lambda readings: readings, after_write)
+    assert writer.submit(READINGS).result(timeout=5) == 1
+    release.set()
+    assert updated.wait(5)
+    # The writer keeps going after a failed update
+    assert writer.submit(READINGS).result(timeout=5) == 1
+    assert writer.stats()['errors'] == 0
+    assert writer.stats()['after_write_errors'] >= 1
+
+def test_failed_commit_fails_the_ack():
+    def write(readings):
+        raise RuntimeError('disk full')
+
+    writer = VitalsWriter(write, lambda stored: pytest.fail('nothing was stored'))
+    with pytest.raises(RuntimeError, match='disk full'):
+        writer.submit(READINGS).result(timeout=5)
+    assert writer.stats()['errors'] == 1
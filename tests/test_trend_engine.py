@@ -0,0 +1,75 @@
+"""Trend state built reading by reading must match state warmed from the database."""
+import random
+
+import numpy as np
+import pytest
+
+import database_utils
+from trend_engine import TrendEngine
+
+def reading(patient_id, day, bp, sugar):
+    return (patient_id, f'2026-03-{day:02d} 08:00:00', 30, 24.5, bp, 11.15, sugar)
+
+@pytest.fixture
+def readings():
+    rng = random.Random(7)
+    readings = [reading(1, day, 118.3 + 4.1 * day, 96.7 + rng.uniform(-20, 60)) for day in range(1, 13)]
+    readings += [reading(2, day, 131.9, 150.2 - day) for day in range(1, 3)]
+    readings += [reading(3, day, 109.0 + rng.uniform(0, 40), 88.4) for day in range(1, 6)]
+    # Devices resend and upload late, so readings arrive out of time order
+    rng.shuffle(readings)
+    return readings
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    database_utils.init_db()
+
+def add(engine, readings):
+    return engine.add_readings([r[0] for r in readings], [r[1] for r in readings], [r[2:7] for r in readings])
+
+def assert_same_state(live, warm):
+    assert sorted(live._rows) == sorted(warm._rows)
+    ids = sorted(live._rows)
+    live_rows = [live._rows[pid] for pid in ids]
+    warm_rows = [warm._rows[pid] for pid in ids]
+    live_stats, warm_stats = live.statistics(live_rows), warm.statistics(warm_rows)
+    for name in ('ewma', 'slope'):
+        np.testing.assert_array_equal(live_stats[name], warm_stats[name])
+    np.testing.assert_array_equal(live.count[live_rows], warm.count[warm_rows])
+    assert [live._times[pid] for pid in ids] == [warm._times[pid] for pid in ids]
+
+def test_bootstrap_matches_incremental_state(database, readings):
+    live = TrendEngine()
+    for start in range(0, len(readings), 4):
+        batch = readings[start:start + 4]
+        database_utils.add_vitals_batch(batch)
+        live.evaluate(add(live, batch))
+
+    warm = TrendEngine()
+    opened, resolved = warm.bootstrap()
+    assert (opened, resolved) == ([], [])
+    assert_same_state(live, warm)
+
+def test_readings_older_than_the_window_are_skipped():
+    newest_first = [reading(1, day, 118.3 + 4.1 * day, 96.7) for day in range(12, 0, -1)]
+    engine = TrendEngine(window=5)
+    add(engine, newest_first[:5])
+    assert add(engine, newest_first[5:]) == []
+
+    in_order = TrendEngine(window=5)
+    add(in_order, newest_first[:5][::-1])
+    assert_same_state(engine, in_order)
+    assert engine.statistics([0])['slope'][0, 0] == pytest.approx(4.1, abs=1e-4)
+
+def test_resent_readings_are_stored_and_counted_once(database, readings):
+    engine = TrendEngine()
+    database_utils.add_vitals_batch(readings)
+    add(engine, readings)
+    resent = [r[:4] + (r[4] + 10,) + r[5:] for r in readings[:6]]
+    database_utils.add_vitals_batch(resent)
+    assert add(engine, resent) == []
+
+    warm = TrendEngine()
+    warm.bootstrap()
+    assert_same_state(engine, warm)
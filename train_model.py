@@ -0,0 +1,41 @@
+"""Train the maternal risk model from CSV, the database or synthetic data.
+
+Examples:
+    python train_model.py --csv data/vitals.csv
+    python train_model.py --db
+    python train_model.py --synthetic 200000 --n-estimators 200
+"""
+import argparse
+import json
+
+from model_utils import (TRAINING_CHUNK_SIZE, iter_csv_chunks, iter_db_chunks, iter_synthetic_chunks,
+                         save_models, train_from_chunks)
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the maternal risk model.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--csv', help='CSV with columns age, bmi, bp, hb, sugar, label')
+    source.add_argument('--db', action='store_true', help='read the training_vitals table')
+    source.add_argument('--synthetic', type=int, default=10_000, help='number of synthetic rows')
+    parser.add_argument('--chunk-size', type=int, default=TRAINING_CHUNK_SIZE)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    args = parser.parse_args()
+
+    if args.csv:
+        chunks = iter_csv_chunks(args.csv, args.chunk_size)
+    elif args.db:
+        chunks = iter_db_chunks(chunk_size=args.chunk_size)
+    else:
+        chunks = iter_synthetic_chunks(args.synthetic, args.chunk_size)
+
+    model, scaler, report = train_from_chunks(chunks, n_estimators=args.n_estimators,
+                                              max_depth=args.max_depth, n_jobs=args.n_jobs)
+    report['source'] = args.csv or ('db' if args.db else 'synthetic')
+    version, report = save_models(model, scaler, report)
+    print(f'Saved model version {version}')
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
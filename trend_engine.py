@@ -0,0 +1,212 @@
+import bisect
+import os
+import threading
+import numpy as np
+
+from database_utils import add_alerts, get_open_alert_keys, get_recent_vitals_all, resolve_alerts
+from model_utils import FEATURE_NAMES
+
+TREND_WINDOW = int(os.getenv('TREND_WINDOW', '5'))
+TREND_ALPHA = float(os.getenv('TREND_ALPHA', '0.3'))
+TRACKED_FEATURES = ('bp', 'sugar')
+
+# (rule, feature, statistic, threshold, minimum readings); slopes are per visit
+DEFAULT_TREND_RULES = (
+    ('bp_high', 'bp', 'ewma', 140.0, 1),
+    ('bp_rising', 'bp', 'slope', 3.0, 3),
+    ('sugar_high', 'sugar', 'ewma', 140.0, 1),
+    ('sugar_rising', 'sugar', 'slope', 5.0, 3),
+)
+
+class TrendEngine:
+    """Per-patient rolling BP/sugar statistics over each patient's last `window` readings.
+
+    Each patient's window is kept in time order in a small fixed-size array, so
+    a reading is folded in with O(window) work and slopes never need history
+    re-read. The EWMA and slope are computed from the window, oldest reading
+    first, when rules are evaluated; as they depend only on the readings in the
+    window, the state bootstrap() warms after a restart is exactly the state
+    built reading by reading, and a restart doesn't open or resolve alerts.
+    Rules are evaluated as array comparisons across all patients at once, and
+    only alert transitions are written to the database.
+
+    The state lives in one process and only sees the readings written through
+    it, so with several app workers their windows differ. add_alerts keeps at
+    most one open alert per patient and rule, so workers can't duplicate alerts,
+    but trends are only complete when one process writes the vitals.
+    """
+
+    def __init__(self, window=TREND_WINDOW, alpha=TREND_ALPHA, rules=DEFAULT_TREND_RULES):
+        self.window = window
+        self.alpha = alpha
+        self.rules = rules
+        self._columns = [FEATURE_NAMES.index(name) for name in TRACKED_FEATURES]
+        self._lock = threading.Lock()
+        self._rows = {}
+        # patient_id -> measured_at of the readings in the window, oldest first
+        self._times = {}
+        self._size = 0
+        self._allocate(1024)
+
+    def _grow(self, name, shape, dtype):
+        array = np.zeros(shape, dtype=dtype)
+        old = getattr(self, name, None)
+        if old is not None:
+            array[:self._size] = old[:self._size]
+        setattr(self, name, array)
+
+    def _allocate(self, capacity):
+        n_tracked = len(self._columns)
+        self._grow('patient_ids', capacity, np.int64)
+        # Readings in the window, which holds them oldest first
+        self._grow('count', capacity, np.int64)
+        self._grow('readings', (capacity, self.window, n_tracked), np.float64)
+        self._grow('active', (capacity, len(self.rules)), bool)
+
+    def _row(self, patient_id):
+        row = self._rows.get(patient_id)
+        if row is None:
+            if self._size == len(self.count):
+                self._allocate(2 * len(self.count))
+            row = self._size
+            self._rows[patient_id] = row
+            self.patient_ids[row] = patient_id
+            self._times[patient_id] = []
+            self._size += 1
+        return row
+
+    def _add(self, patient_id, measured_at, features):
+        """Put a reading in its place in the patient's window; returns its row, or None if too old."""
+        row = self._row(patient_id)
+        times = self._times[patient_id]
+        position = bisect.bisect_left(times, measured_at)
+        # A resent reading; the database keeps the first one too
+        if position < len(times) and times[position] == measured_at:
+            return None
+        if len(times) == self.window:
+            if position == 0:
+                return None
+            # The oldest reading leaves the window
+            times.pop(0)
+            self.readings[row, :position - 1] = self.readings[row, 1:position]
+            position -= 1
+        else:
+            self.readings[row, position + 1:len(times) + 1] = self.readings[row, position:len(times)]
+        times.insert(position, measured_at)
+        # Rounded to float32 like the stored readings bootstrap() reads back
+        self.readings[row, position] = np.asarray(features, dtype=np.float32)[self._columns]
+        self.count[row] = len(times)
+        return row
+
+    def add_readings(self, patient_ids, measured_at, matrix):
+        """Fold readings into the rolling state; returns the touched rows.
+
+        Readings may arrive in any order, as devices upload late or resend:
+        each goes to its place in time within the patient's window. One older
+        than a full window is skipped, as it is no longer among the patient's
+        latest readings, and so is one at a time already in the window.
+        """
+        touched = set()
+        with self._lock:
+            for patient_id, timestamp, features in zip(patient_ids, measured_at, matrix):
+                touched.add(self._add(int(patient_id), timestamp, features))
+        touched.discard(None)
+        return sorted(touched)
+
+    def _bulk_load(self, patient_ids, measured_at, matrix):
+        """Vectorized add_readings for an empty engine; readings sorted by patient, then time."""
+        if not len(patient_ids):
+            return
+        unique_ids, first, inverse = np.unique(patient_ids, return_index=True, return_inverse=True)
+        position = np.arange(len(patient_ids)) - first[inverse]
+        with self._lock:
+            rows = np.array([self._row(int(pid)) for pid in unique_ids])[inverse]
+            values = np.asarray(matrix, dtype=np.float64)[:, self._columns]
+            # Only each patient's newest `window` readings stay
+            counts = np.bincount(inverse)
+            keep = position >= counts[inverse] - self.window
+            t = (position - np.maximum(counts[inverse] - self.window, 0))[keep]
+            self.readings[rows[keep], t] = values[keep]
+            self.count[rows[keep]] = np.minimum(counts[inverse], self.window)[keep]
+            for i in np.flatnonzero(keep):
+                self._times[int(patient_ids[i])].append(measured_at[i])
+
+    def statistics(self, rows):
+        """EWMA and per-visit slope for the given rows, each shaped (rows, tracked features).
+
+        Both are computed over the readings in the window, oldest first, with
+        the EWMA seeded from the oldest one.
+        """
+        n = self.count[rows]
+        ewma = np.zeros((len(rows), len(self._columns)))
+        sum_x = np.zeros((len(rows), 1))
+        sum_xx = np.zeros((len(rows), 1))
+        sum_y = np.zeros_like(ewma)
+        sum_xy = np.zeros_like(ewma)
+        for k in range(self.window):
+            valid = k < n
+            values = self.readings[rows, k]
+            if k == 0:
+                ewma[valid] = values[valid]
+            else:
+                ewma[valid] += self.alpha * (values[valid] - ewma[valid])
+            weight = valid[:, None]
+            sum_x += k * weight
+            sum_xx += k * k * weight
+            sum_y += values * weight
+            sum_xy += k * values * weight
+        n = n.astype(np.float64)[:, None]
+        denominator = n * sum_xx - sum_x ** 2
+        numerator = n * sum_xy - sum_x * sum_y
+        slope = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+        return {'ewma': ewma, 'slope': slope}
+
+    def evaluate(self, rows=None):
+        """Evaluate all rules for rows (default: every patient) and persist alert changes.
+
+        Returns (opened, resolved) lists of (patient_id, rule[, value]).
+        """
+        with self._lock:
+            rows = np.arange(self._size) if rows is None else np.asarray(rows, dtype=np.intp)
+            if not len(rows):
+                return [], []
+            stats = self.statistics(rows)
+            counts = self.count[rows]
+            ids = self.patient_ids[rows]
+            opened, resolved = [], []
+            for i, (rule, feature, statistic, threshold, min_readings) in enumerate(self.rules):
+                values = stats[statistic][:, TRACKED_FEATURES.index(feature)]
+                firing = (values >= threshold) & (counts >= min_readings)
+                was_active = self.active[rows, i]
+                for j in np.flatnonzero(firing & ~was_active):
+                    opened.append((int(ids[j]), rule, float(values[j])))
+                for j in np.flatnonzero(~firing & was_active):
+                    resolved.append((int(ids[j]), rule))
+                self.active[rows, i] = firing
+        if opened:
+            add_alerts(opened)
+        if resolved:
+            resolve_alerts(resolved)
+        return opened, resolved
+
+    def bootstrap(self):
+        """Warm the state from each patient's last `window` stored readings (once, at startup)."""
+        patient_ids, measured_at, matrix = get_recent_vitals_all(self.window)
+        self._bulk_load(patient_ids, measured_at, matrix)
+        rule_index = {rule[0]: i for i, rule in enumerate(self.rules)}
+        with self._lock:
+            for patient_id, rule in get_open_alert_keys():
+                row = self._rows.get(patient_id)
+                if row is not None and rule in rule_index:
+                    self.active[row, rule_index[rule]] = True
+        # Reconcile alerts left open (or never raised) before a restart
+        return self.evaluate()
+
+    def stats(self):
+        with self._lock:
+            active = self.active[:self._size].sum(axis=0)
+        return {
+            'patients': self._size,
+            'window': self.window,
+            'active_alerts': {rule[0]: int(n) for rule, n in zip(self.rules, active)},
+        }
@@ -0,0 +1,146 @@
+"""Hyperparameter search for the maternal risk model, trading accuracy against serving latency.
+
+Each n_estimators/max_depth candidate is cross-validated in a process pool and
+measured for held-out accuracy, single-row and batch inference latency and
+pickled artifact size. The Pareto front and the smallest, fastest candidate
+that meets the accuracy floor are reported.
+
+Examples:
+    python tune_model.py --synthetic 50000 --accuracy-floor 0.95
+    python tune_model.py --csv data/vitals.csv --n-estimators 25 50 100 --max-depth 6 10 0
+"""
+import argparse
+import itertools
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import cross_val_score, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from model_utils import TRAINING_CHUNK_SIZE, iter_csv_chunks, iter_db_chunks, synthetic_vitals
+
+# Training data shared with pool workers through the initializer
+_data = {}
+
+def _init_worker(X_train, X_test, y_train, y_test):
+    _data.update(X_train=X_train, X_test=X_test, y_train=y_train, y_test=y_test)
+
+def _time_per_call(fn, repeats):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+def evaluate_candidate(params, cv=3):
+    """Cross-validate and fit one candidate in a pool worker; returns (result, pickled model)."""
+    n_estimators, max_depth = params
+    X_train, X_test = _data['X_train'], _data['X_test']
+    y_train, y_test = _data['y_train'], _data['y_test']
+    # Serving predicts with one thread, so train the candidate that way too
+    model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, n_jobs=1, random_state=0)
+
+    start = time.perf_counter()
+    cv_scores = cross_val_score(model, X_train, y_train, cv=cv)
+    model.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - start
+
+    model_bytes = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        'n_estimators': n_estimators,
+        'max_depth': max_depth,
+        'cv_accuracy': float(cv_scores.mean()),
+        'cv_std': float(cv_scores.std()),
+        'holdout_accuracy': float(model.score(X_test, y_test)),
+        'artifact_bytes': len(model_bytes),
+        'train_seconds': train_seconds,
+    }, model_bytes
+
+def measure_latency(result, model_bytes, X_test, batch_size=256):
+    """Time single-row and batch predictions; run serially so candidates don't contend for cores."""
+    model = pickle.loads(model_bytes)
+    row = X_test[:1]
+    batch = X_test[:batch_size]
+    result['single_row_ms'] = _time_per_call(lambda: model.predict(row), 50) * 1000
+    result['batch_ms'] = _time_per_call(lambda: model.predict(batch), 10) * 1000
+    result['batch_size'] = len(batch)
+    return result
+
+def pareto_front(results):
+    """Candidates not dominated on (accuracy up, single-row latency down, artifact size down)."""
+    def dominates(a, b):
+        no_worse = (a['holdout_accuracy'] >= b['holdout_accuracy'] and a['single_row_ms'] <= b['single_row_ms']
+                    and a['artifact_bytes'] <= b['artifact_bytes'])
+        better = (a['holdout_accuracy'] > b['holdout_accuracy'] or a['single_row_ms'] < b['single_row_ms']
+                  or a['artifact_bytes'] < b['artifact_bytes'])
+        return no_worse and better
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+def recommend(results, accuracy_floor):
+    eligible = [r for r in results if r['holdout_accuracy'] >= accuracy_floor]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r['single_row_ms'], r['artifact_bytes']))
+
+def load_data(args):
+    if args.csv:
+        chunks = list(iter_csv_chunks(args.csv, TRAINING_CHUNK_SIZE))
+    elif args.db:
+        chunks = list(iter_db_chunks())
+    else:
+        chunks = [synthetic_vitals(args.synthetic, seed=0)]
+    X = np.concatenate([X for X, _ in chunks])
+    y = np.concatenate([y for _, y in chunks])
+    return X, y
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the maternal risk model for accuracy vs latency.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--csv', help='CSV with columns age, bmi, bp, hb, sugar, label')
+    source.add_argument('--db', action='store_true', help='read the training_vitals table')
+    source.add_argument('--synthetic', type=int, default=20_000, help='number of synthetic rows')
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[10, 25, 50, 100, 200])
+    parser.add_argument('--max-depth', type=int, nargs='+', default=[4, 8, 12, 0], help='0 means unlimited')
+    parser.add_argument('--cv', type=int, default=3)
+    parser.add_argument('--accuracy-floor', type=float, default=0.9)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--report', help='write the full report as JSON to this path')
+    args = parser.parse_args()
+
+    X, y = load_data(args)
+    X = StandardScaler().fit_transform(X).astype(np.float32)
+    split = train_test_split(X, y, test_size=0.2, random_state=0, stratify=y)
+    candidates = list(itertools.product(args.n_estimators, [d or None for d in args.max_depth]))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=split) as pool:
+        fitted = list(pool.map(evaluate_candidate, candidates, itertools.repeat(args.cv)))
+    results = [measure_latency(result, model_bytes, split[1]) for result, model_bytes in fitted]
+    elapsed = time.perf_counter() - start
+
+    front = pareto_front(results)
+    best = recommend(results, args.accuracy_floor)
+
+    print(f'{len(candidates)} candidates on {len(y)} rows in {elapsed:.1f}s with {args.workers} workers')
+    print(f'{"trees":>6}{"depth":>7}{"cv acc":>9}{"holdout":>9}{"row ms":>9}{"batch ms":>10}{"KB":>9}  pareto')
+    for r in sorted(results, key=lambda r: (r['single_row_ms'], -r['holdout_accuracy'])):
+        print(f'{r["n_estimators"]:>6}{str(r["max_depth"]):>7}{r["cv_accuracy"]:>9.4f}{r["holdout_accuracy"]:>9.4f}'
+              f'{r["single_row_ms"]:>9.2f}{r["batch_ms"]:>10.2f}{r["artifact_bytes"] / 1024:>9.0f}  '
+              f'{"*" if r in front else ""}')
+    if best:
+        print(f'Recommended (accuracy >= {args.accuracy_floor}): n_estimators={best["n_estimators"]}, '
+              f'max_depth={best["max_depth"]}')
+    else:
+        print(f'No candidate reaches accuracy {args.accuracy_floor}.')
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'candidates': results, 'pareto_front': front, 'recommended': best,
+                       'accuracy_floor': args.accuracy_floor}, f, indent=2)
+
+if __name__ == '__main__':
+    main()